@@ -1,118 +1,359 @@
-from flask import Flask, jsonify, request
+import logging
+import os
+import tempfile
+import time
+
+from flask import Flask, Response, g, jsonify, request
+from . import rpc
+from .binary_rpc import BinaryRpcServer, BinaryTransport
 from .chord import ChordNode
+from .client import NodeClient
+from .hashing import hash_key
+from .storage import DiskChunkStore, LogKeyStore
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 chord_node = None
+# Nodos de este proceso por puerto (más de uno con nodos virtuales)
+nodes = {}
 
-def create_chord_node(id, port, ip):
+def create_chord_node(id, port, ip, client_options=None, data_dir=None, cache_options=None,
+                      transport='http', rpc_port_offset=1000, bits=32, process=None, client=None, replicas=2,
+                      content_options=None, handoff_batch=10000):
     global chord_node
-    chord_node = ChordNode(id, port, ip)
-    return chord_node
+    # Con data_dir las claves del nodo (y las réplicas que guarda) sobreviven a un reinicio
+    storage = LogKeyStore(os.path.join(data_dir, f"node-{id}")) if data_dir else None
+    replica_storage = LogKeyStore(os.path.join(data_dir, f"node-{id}-replicas")) if data_dir else None
+    # El contenido de los archivos siempre va a disco; sin data_dir, a un directorio temporal
+    chunk_directory = os.path.join(data_dir, f"node-{id}-chunks") if data_dir else tempfile.mkdtemp(prefix=f"chord-{id}-chunks-")
+    if client is None and transport == 'binary':
+        # Las llamadas entre nodos van por TCP binario; la API REST sigue disponible para clientes externos
+        client = BinaryTransport(port_offset=rpc_port_offset, **(client_options or {}))
+    elif client is None:
+        client = NodeClient(**(client_options or {}))
+    node = ChordNode(id, port, ip, bits=bits, client=client, storage=storage, process=process,
+                     replicas=replicas, replica_storage=replica_storage, chunk_store=DiskChunkStore(chunk_directory),
+                     handoff_batch=handoff_batch,
+                     **(cache_options or {}), **(content_options or {}))
+    if transport == 'binary':
+        BinaryRpcServer(node, '0.0.0.0', port + rpc_port_offset).start()
+    nodes[port] = node
+    if chord_node is None or chord_node.port == port:
+        chord_node = node
+    return node
+
+def current_node():
+    # Cada nodo virtual escucha en su propio puerto: la petición la atiende el nodo de ese puerto
+    port = request.environ.get('SERVER_PORT', '')
+    return nodes.get(int(port), chord_node) if port.isdigit() else chord_node
+
+def rpc_response(path, args):
+    # Las operaciones entre nodos están en app/rpc.py para compartirlas con otros transportes
+    body, status = rpc.dispatch(current_node(), path, args)
+    return jsonify(body), status
+
+def batch_keys(node, body):
+    """
+    Claves de un lote: file_ids reducidos al anillo (módulo 2^bits) más el hash de cada nombre en file_names.
+    Retorna las claves y un diccionario clave -> nombre; lanza ValueError o TypeError si el lote no es válido.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("A JSON body with file_ids or file_names is required")
+    file_ids = body.get('file_ids', [])
+    file_names = body.get('file_names', [])
+    if not isinstance(file_ids, list) or not isinstance(file_names, list) or not (file_ids or file_names):
+        raise ValueError("A list of file IDs or file names is required")
+    names = {hash_key(file_name, node.total_bits): file_name for file_name in file_names}
+    ring_size = 2**node.total_bits
+    return [int(file_id) % ring_size for file_id in file_ids] + list(names), names
+
+def batch_request():
+    """
+    Nodo y claves del lote de la petición, o (None, respuesta 400) si el cuerpo no es un lote válido.
+    """
+    node = current_node()
+    try:
+        return node, batch_keys(node, request.get_json(silent=True))
+    except (TypeError, ValueError) as e:
+        return None, (jsonify({"error": str(e)}), 400)
+
+def with_names(results, names):
+    return [dict(result, file_name=names[result['file_id']]) if result['file_id'] in names else result for result in results]
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    if chord_node is not None and 'started' in g:
+        current_node().metrics.observe_request(request.endpoint or 'not_found', response.status_code, time.perf_counter() - g.started)
+    return response
 
 @app.route('/join', methods=['POST'])
 def join_network():
-    node_address = request.json.get('node_address')
-    node_port = request.json.get('node_port')
-    node_ip = request.json.get('node_ip')  # Agregar IP del nodo
-    if node_address and node_port and node_ip:
-        success = chord_node.join((node_address, node_port, node_ip))  # Pasar IP
-        return jsonify({"success": success}), 200
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Node port and IP are required"}), 400
+    node_address = body.get('node_address')  # Opcional: si no se envía se le pregunta al nodo conocido
+    node_port = body.get('node_port')
+    node_ip = body.get('node_ip')  # Agregar IP del nodo
+    if node_port is not None and node_ip:
+        try:
+            known_node = (int(node_address) if node_address is not None else None, int(node_port), node_ip)  # Pasar IP
+        except (TypeError, ValueError):
+            return jsonify({"error": "Node address and port must be integers"}), 400
+        node = current_node()
+        result = node.join(known_node)
+        # Los demás nodos virtuales del proceso se unen a través del mismo nodo conocido
+        virtual_nodes = [other.join(known_node) for other in list(nodes.values()) if other is not node]
+        if virtual_nodes:
+            result['virtual_nodes'] = virtual_nodes
+            result['success'] = result['success'] and all(other['success'] for other in virtual_nodes)
+            result['conflict'] = result.get('conflict', False) or any(other.get('conflict') for other in virtual_nodes)
+        if result['success']:
+            return jsonify(result), 200
+        # 409: el id del nodo ya lo usa otro nodo del anillo
+        return jsonify(result), 409 if result.get('conflict') else 502
     else:
-        return jsonify({"error": "Node address, port, and IP are required"}), 400
+        return jsonify({"error": "Node port and IP are required"}), 400
 
 @app.route('/leave', methods=['POST'])
 def leave_network():
-    chord_node.leave()
-    return jsonify({"success": True}), 200
+    # Bloquea solo a quien pide la salida; las demás peticiones se siguen atendiendo durante la transferencia
+    result = current_node().leave()
+    return jsonify(result), 200 if result['success'] else 502
+
+@app.route('/handoff_status', methods=['GET'])
+def handoff_status():
+    return jsonify(current_node().handoff_status()), 200
 
 @app.route('/show', methods=['GET'])
 def show_network():
-    network_structure = chord_node.show()
+    network_structure = current_node().show()
     return jsonify({"success": True, "network": " ---> ".join(network_structure)}), 200
 
 @app.route('/show_finger_table', methods=['GET'])
 def show_finger_table():
-    finger_table = chord_node.show_finger_table()
+    finger_table = current_node().show_finger_table()
     return f"<pre>{finger_table}</pre>", 200
 
 @app.route('/upload', methods=['POST'])
 def store_file():
-    file_id = request.json.get('file_id')  # Asumiendo que ahora pasas un número directamente
-    if file_id is not None:
-        chord_node.store_file_via_finger_table(file_id)
-        return jsonify({"success": True, "message": f"Archivo '{file_id}' almacenado usando la finger table."}), 200
-    else:
-        return jsonify({"error": "File ID is required"}), 400
+    return rpc_response('/upload', request.get_json(silent=True))
 
 @app.route('/lookup', methods=['GET'])
 def lookup():
     key = request.args.get('key')
-    if key:
-        node = chord_node.lookup(key)
-        return jsonify({"node": node}), 200
+    file_name = request.args.get('file_name')
+    if key or file_name is not None:
+        node = current_node()
+        try:
+            key = int(key) if key else hash_key(file_name, node.total_bits)
+        except ValueError:
+            return jsonify({"error": f"Clave inválida: {key!r}"}), 400
+        target_node, hops = node.find_successor(key)
+        return jsonify({"key": key, "node": target_node, "hops": hops}), 200
     else:
-        return jsonify({"error": "Key is required"}), 400
+        return jsonify({"error": "Key or file name is required"}), 400
+
+@app.route('/find_successor', methods=['GET'])
+def find_successor():
+    return rpc_response('/find_successor', request.args)
+
+@app.route('/find_successor_step', methods=['GET'])
+def find_successor_step():
+    return rpc_response('/find_successor_step', request.args)
 
 @app.route('/find_file', methods=['GET'])
 def find_file():
-    file_id = request.args.get('file_id')
+    node = current_node()
+    try:
+        file_id = rpc.file_key(node, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if file_id is not None:
-        node_id, node_port = chord_node.find_and_store_local_file(int(file_id))
+        name = request.args.get('file_name', file_id)
+        node_id, node_port, hops = node.find_and_store_local_file(file_id)
         if node_id is not None:
-            return jsonify({"success": True, "message": f"Archivo '{file_id}' encontrado en nodo {node_id} ({node_port})"}), 200
+            return jsonify({"success": True, "file_id": file_id, "hops": hops, "message": f"Archivo '{name}' encontrado en nodo {node_id} ({node_port})"}), 200
         else:
-            return jsonify({"error": "Archivo no encontrado"}), 404
+            return jsonify({"error": "Archivo no encontrado", "file_id": file_id, "hops": hops}), 404
     else:
-        return jsonify({"error": "File ID is required"}), 400
+        return jsonify({"error": "File ID or file name is required"}), 400
+
+@app.route('/upload_file', methods=['POST', 'PUT'])
+def upload_file():
+    file_name = request.args.get('file_name')
+    if not file_name:
+        return jsonify({"error": "File name is required"}), 400
+    # El cuerpo se lee por bloques a medida que se envían al anillo, sin cargar el archivo completo
+    manifest = current_node().upload_content(file_name, request.stream)
+    if manifest is None:
+        return jsonify({"error": f"No se pudo almacenar el contenido de '{file_name}'"}), 502
+    return jsonify({"success": True, "file_name": file_name, "file_id": manifest['file_id'], "size": manifest['size'],
+                    "chunks": len(manifest['chunks']), "chunk_size": manifest['chunk_size']}), 200
+
+@app.route('/download_file', methods=['GET'])
+def download_file():
+    file_name = request.args.get('file_name')
+    if not file_name:
+        return jsonify({"error": "File name is required"}), 400
+    node = current_node()
+    manifest = node.get_manifest(file_name)
+    if manifest is None:
+        return jsonify({"error": "Archivo no encontrado", "file_name": file_name}), 404
+
+    size = manifest['size']
+    start, end, status = 0, size, 200
+    headers = {'Accept-Ranges': 'bytes'}
+    if request.range is not None:
+        # Solo se atiende un rango; con varios rangos se envía el archivo completo
+        if len(request.range.ranges) == 1:
+            byte_range = request.range.range_for_length(size)
+            if byte_range is None:
+                return Response(status=416, headers={'Content-Range': f"bytes */{size}"})
+            start, end = byte_range
+            status = 206
+            headers['Content-Range'] = f"bytes {start}-{end - 1}/{size}"
+    headers['Content-Length'] = str(end - start)
+
+    def stream():
+        try:
+            yield from node.read_content(manifest, start, end)
+        except IOError as e:
+            # Los encabezados ya se enviaron: se corta la respuesta para que el cliente no reciba un archivo incompleto como válido
+            logger.error("Descarga de '%s' interrumpida: %s", file_name, e)
+            raise
+
+    return Response(stream(), status=status, headers=headers, mimetype='application/octet-stream')
+
+@app.route('/upload_batch', methods=['POST'])
+def store_file_batch():
+    node, batch = batch_request()
+    if node is None:
+        return batch
+    file_ids, names = batch
+    results, hops = node.store_files_batch(file_ids)
+    failed = sum(not result['success'] for result in results)
+    body = {"success": not failed, "hops": hops, "results": with_names(results, names)}
+    if failed:
+        # Algún nodo responsable no guardó su parte del lote: el detalle está en el error de cada resultado
+        body["error"] = f"{failed} de {len(results)} archivos no se pudieron almacenar"
+        return jsonify(body), 502
+    return jsonify(body), 200
+
+@app.route('/find_batch', methods=['POST'])
+def find_file_batch():
+    node, batch = batch_request()
+    if node is None:
+        return batch
+    file_ids, names = batch
+    results, hops = node.find_files_batch(file_ids)
+    return jsonify({"success": True, "hops": hops, "results": with_names(results, names)}), 200
+
+@app.route('/store_batch', methods=['POST'])
+def store_batch():
+    return rpc_response('/store_batch', request.get_json(silent=True))
+
+@app.route('/check_batch', methods=['POST'])
+def check_batch():
+    return rpc_response('/check_batch', request.get_json(silent=True))
+
+@app.route('/replicate', methods=['POST'])
+def replicate():
+    return rpc_response('/replicate', request.get_json(silent=True))
+
+@app.route('/replica_digest', methods=['POST'])
+def replica_digest():
+    return rpc_response('/replica_digest', request.get_json(silent=True))
+
+@app.route('/store_chunk', methods=['PUT'])
+def store_chunk():
+    return rpc_response('/store_chunk', dict(request.args.items(), data=request.get_data()))
+
+@app.route('/replicate_chunk', methods=['PUT'])
+def replicate_chunk():
+    return rpc_response('/replicate_chunk', dict(request.args.items(), data=request.get_data()))
+
+@app.route('/chunk', methods=['GET'])
+def chunk():
+    body, status = rpc.dispatch(current_node(), '/chunk', request.args)
+    if status != 200:
+        return jsonify(body), status
+    return Response(body, mimetype='application/octet-stream')
+
+@app.route('/store_manifest', methods=['POST'])
+def store_manifest():
+    return rpc_response('/store_manifest', request.get_json(silent=True))
+
+@app.route('/manifest', methods=['GET'])
+def manifest():
+    return rpc_response('/manifest', request.args)
+
+@app.route('/handoff', methods=['POST'])
+def handoff():
+    return rpc_response('/handoff', request.get_json(silent=True))
 
 @app.route('/check_file', methods=['GET'])
 def check_file():
-    file_id = int(request.args.get('file_id'))
-    exists = file_id in chord_node.files
-    return jsonify({"exists": exists}), 200
-
-@app.route('/check_predecessor', methods=['GET'])
-def check_predecessor():
-    file_id = int(request.args.get('file_id'))
-    continue_search = chord_node.predecessor.id > file_id if chord_node.predecessor else False
-    return jsonify({
-        "continue_search": continue_search,
-        "predecessor_id": chord_node.predecessor.id if chord_node.predecessor else None,
-        "predecessor_port": chord_node.predecessor.port if chord_node.predecessor else None
-    }), 200
+    return rpc_response('/check_file', request.args)
+
+@app.route('/get_predecessor', methods=['GET'])
+def get_predecessor():
+    return rpc_response('/get_predecessor', request.args)
+
+@app.route('/notify', methods=['POST'])
+def notify():
+    return rpc_response('/notify', request.get_json(silent=True))
+
+@app.route('/ping', methods=['GET'])
+def ping():
+    return rpc_response('/ping', request.args)
+
+@app.route('/node_state', methods=['GET'])
+def node_state():
+    return rpc_response('/node_state', request.args)
+
+@app.route('/node_load', methods=['GET'])
+def node_load():
+    return rpc_response('/node_load', request.args)
+
+@app.route('/balance', methods=['GET'])
+def balance():
+    return jsonify(current_node().balance()), 200
 
 @app.route('/update_predecessor', methods=['POST'])
 def update_predecessor():
-    predecessor_id = request.json.get('predecessor_id')
-    predecessor_port = request.json.get('predecessor_port')
-    predecessor_ip = request.json.get('predecessor_ip')  # Agregar IP del predecesor
-    if predecessor_id and predecessor_port and predecessor_ip:
-        chord_node.predecessor = ChordNode(predecessor_id, predecessor_port, predecessor_ip)
-        return jsonify({"success": True}), 200
-    else:
-        return jsonify({"error": "Predecessor ID, port, and IP are required"}), 400
+    return rpc_response('/update_predecessor', request.get_json(silent=True))
 
 @app.route('/update_successor', methods=['POST'])
 def update_successor():
-    successor_id = request.json.get('successor_id')
-    successor_port = request.json.get('successor_port')
-    successor_ip = request.json.get('successor_ip')  # Agregar IP del sucesor
-    if successor_id and successor_port and successor_ip:
-        chord_node.successor = ChordNode(successor_id, successor_port, successor_ip)
-        return jsonify({"success": True}), 200
-    else:
-        return jsonify({"error": "Successor ID, port, and IP are required"}), 400
+    return rpc_response('/update_successor', request.get_json(silent=True))
 
 @app.route('/update_finger_table', methods=['POST'])
 def update_finger_table():
-    new_node_id = request.json.get('new_node_id')
-    new_node_port = request.json.get('new_node_port')
-    new_node_ip = request.json.get('new_node_ip')  # Agregar IP del nuevo nodo
-    if new_node_id is not None and new_node_port is not None and new_node_ip is not None:
-        chord_node.update_fingers_with_new_node(new_node_id, new_node_port, new_node_ip)
-        return jsonify({"success": True}), 200
-    else:
-        return jsonify({"error": "New node ID, port, and IP are required"}), 400
+    return rpc_response('/update_finger_table', request.get_json(silent=True))
+
+@app.route('/client_stats', methods=['GET'])
+def client_stats():
+    return jsonify(current_node().client.pool_stats()), 200
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(current_node().owner_cache.stats()), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    node = current_node()
+    result = node.metrics.snapshot()
+    result['outbound_rpc'] = node.client.pool_stats()
+    result['owner_cache'] = node.owner_cache.stats()
+    result['keys_stored'] = len(node.files)
+    result['local_files'] = len(node.local_files)
+    result['chunks_stored'] = len(node.chunks)
+    return jsonify(result), 200
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0')
@@ -0,0 +1,281 @@
+import asyncio
+import queue
+import socket
+import struct
+import threading
+import time
+
+import requests
+
+from . import rpc
+from .client import NodeClient
+
+# Marcas de tipo de la codificación binaria (un byte por valor)
+NONE, TRUE, FALSE, INT, FLOAT, STR, BYTES, LIST, DICT = b'NTFIDSBLM'
+LENGTH = struct.Struct('>I')
+FLOAT_FORMAT = struct.Struct('>d')
+
+
+def encode(value, out=None):
+    """
+    Codifica None, bool, int (de cualquier tamaño), float, str, bytes, listas y diccionarios.
+    """
+    out = bytearray() if out is None else out
+    if value is None:
+        out.append(NONE)
+    elif value is True:
+        out.append(TRUE)
+    elif value is False:
+        out.append(FALSE)
+    elif isinstance(value, int):
+        data = value.to_bytes((value.bit_length() + 8) // 8, 'big', signed=True)
+        out.append(INT)
+        out.append(len(data))
+        out += data
+    elif isinstance(value, float):
+        out.append(FLOAT)
+        out += FLOAT_FORMAT.pack(value)
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        out.append(STR)
+        out += LENGTH.pack(len(data))
+        out += data
+    elif isinstance(value, (bytes, bytearray)):
+        out.append(BYTES)
+        out += LENGTH.pack(len(value))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        out.append(LIST)
+        out += LENGTH.pack(len(value))
+        for item in value:
+            encode(item, out)
+    elif isinstance(value, dict):
+        out.append(DICT)
+        out += LENGTH.pack(len(value))
+        for key, item in value.items():
+            encode(key, out)
+            encode(item, out)
+    else:
+        raise TypeError(f"Tipo no soportado en la codificación binaria: {type(value).__name__}")
+    return out
+
+
+def _check_size(data, offset, size):
+    if offset + size > len(data):
+        raise ValueError(f"Trama truncada: se esperaban {size} bytes en la posición {offset} de {len(data)}")
+
+
+def decode(data, offset=0):
+    """
+    Decodifica un valor a partir de offset. Retorna el valor y la posición siguiente.
+    Lanza ValueError si los datos están truncados o tienen una marca de tipo desconocida.
+    """
+    _check_size(data, offset, 1)
+    tag = data[offset]
+    offset += 1
+    if tag == NONE:
+        return None, offset
+    if tag == TRUE:
+        return True, offset
+    if tag == FALSE:
+        return False, offset
+    if tag == INT:
+        _check_size(data, offset, 1)
+        size = data[offset]
+        offset += 1
+        _check_size(data, offset, size)
+        return int.from_bytes(data[offset:offset + size], 'big', signed=True), offset + size
+    if tag == FLOAT:
+        _check_size(data, offset, FLOAT_FORMAT.size)
+        return FLOAT_FORMAT.unpack_from(data, offset)[0], offset + FLOAT_FORMAT.size
+    if tag not in (STR, BYTES, LIST, DICT):
+        raise ValueError(f"Marca de tipo desconocida: {tag}")
+    _check_size(data, offset, LENGTH.size)
+    (size,) = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    if tag in (STR, BYTES):
+        _check_size(data, offset, size)
+    if tag == STR:
+        return bytes(data[offset:offset + size]).decode('utf-8'), offset + size
+    if tag == BYTES:
+        return bytes(data[offset:offset + size]), offset + size
+    if tag == LIST:
+        items = []
+        for _ in range(size):
+            item, offset = decode(data, offset)
+            items.append(item)
+        return items, offset
+    if tag == DICT:
+        items = {}
+        for _ in range(size):
+            key, offset = decode(data, offset)
+            items[key], offset = decode(data, offset)
+        return items, offset
+
+
+def decode_frame(payload):
+    """
+    Decodifica el contenido de una trama, que debe ser exactamente un valor.
+    """
+    value, offset = decode(payload)
+    if offset != len(payload):
+        raise ValueError(f"Trama con {len(payload) - offset} bytes sobrantes")
+    return value
+
+
+def frame(value):
+    payload = encode(value)
+    return LENGTH.pack(len(payload)) + payload
+
+
+class BinaryRpcServer:
+    """
+    Servidor asyncio de conexiones TCP persistentes. Cada mensaje es una trama con prefijo de longitud
+    [operación, argumentos] y la respuesta es [código de estado, cuerpo]. Las operaciones son las mismas
+    de la API REST (app/rpc.py) y se ejecutan en hilos para no bloquear el event loop.
+    """
+    def __init__(self, node, host, port):
+        self.node = node
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    async def _handle(self, reader, writer):
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                (size,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+                payload = await reader.readexactly(size)
+                try:
+                    path, args = decode_frame(payload)
+                except (TypeError, ValueError) as e:
+                    # La trama se leyó completa según su prefijo, así que la conexión sigue alineada
+                    writer.write(frame([400, {"error": f"Trama inválida: {e}"}]))
+                    await writer.drain()
+                    continue
+                body, status = await self.loop.run_in_executor(None, rpc.dispatch, self.node, path, args)
+                writer.write(frame([status, body]))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="binary-rpc", daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+
+class BinaryTransport(NodeClient):
+    """
+    Cliente del BinaryRpcServer con la misma interfaz que NodeClient. Mantiene hasta pool_size sockets
+    abiertos por nodo remoto; el servidor binario de cada nodo escucha en su puerto HTTP + port_offset.
+    """
+    def __init__(self, port_offset=1000, **options):
+        super().__init__(**options)
+        self.port_offset = port_offset
+        self.pool_size = options.get('pool_size', 10)
+        self.sockets = {}
+        self.sockets_lock = threading.Lock()
+
+    def _pool(self, address):
+        with self.sockets_lock:
+            return self.sockets.setdefault(address, queue.LifoQueue())
+
+    def _connect(self, address, timeout):
+        host, port = address.rsplit(':', 1)
+        sock = socket.create_connection((host, int(port) + self.port_offset), timeout=timeout[0])
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @staticmethod
+    def _recv_exactly(sock, size):
+        chunks = []
+        while size:
+            chunk = sock.recv(size)
+            if not chunk:
+                raise ConnectionError("El nodo remoto cerró la conexión")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def _call(self, sock, message, timeout):
+        sock.settimeout(timeout[1])
+        sock.sendall(message)
+        (size,) = LENGTH.unpack(self._recv_exactly(sock, LENGTH.size))
+        status, body = decode_frame(self._recv_exactly(sock, size))
+        return status, body
+
+    def put_data(self, node, path, data, params=None, timeout=None):
+        # La codificación binaria transporta bytes: el bloque va como un argumento más
+        return self._request('PUT', node, path, timeout, json=dict(params or {}, data=data))
+
+    def _request(self, method, node, path, timeout, params=None, json=None):
+        address = self._address(node)
+        timeout = timeout or self.timeout
+        if not isinstance(timeout, tuple):
+            timeout = (timeout, timeout)
+        message = frame([path, params if method == 'GET' else json])
+        pool = self._pool(address)
+        started = time.perf_counter()
+        failed = True
+        try:
+            try:
+                sock = pool.get_nowait()
+                reused = True
+            except queue.Empty:
+                sock, reused = None, False
+
+            answered = False
+            try:
+                for attempt in range(2):
+                    try:
+                        if sock is None:
+                            sock = self._connect(address, timeout)
+                        self.stats.record_checkout(address, reused)
+                        status, body = self._call(sock, message, timeout)
+                        break
+                    except socket.timeout as e:
+                        raise requests.exceptions.Timeout(f"Timeout en {address}{path}: {e}")
+                    except (TypeError, ValueError) as e:
+                        raise requests.exceptions.RequestException(f"Respuesta inválida de {address}{path}: {e}")
+                    except OSError as e:
+                        # Un socket reutilizado pudo haber sido cerrado por el otro nodo: se reintenta una vez
+                        if not reused or attempt:
+                            raise requests.exceptions.ConnectionError(f"Error de conexión con {address}{path}: {e}")
+                        sock.close()
+                        sock, reused = None, False
+                answered = True
+            finally:
+                # Tras cualquier error el socket puede quedar a mitad de una trama: no vuelve al pool
+                if not answered and sock is not None:
+                    sock.close()
+
+            if pool.qsize() < self.pool_size:
+                pool.put(sock)
+            else:
+                sock.close()
+            failed = status >= 500
+            return rpc.RpcResponse(body, status)
+        finally:
+            self.stats.record_request(address, time.perf_counter() - started, failed)
@@ -0,0 +1,101 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+class OwnerCache:
+    """
+    Caché LRU con TTL de rangos de claves a nodo responsable. Cada entrada recuerda que el nodo
+    owner es responsable de todas las claves en [low, owner] (intervalo circular), lo que se sabe
+    por haber resuelto la clave low hacia ese nodo.
+    """
+    def __init__(self, bits, capacity=1024, ttl=30.0):
+        self.ring_size = 2**bits
+        self.capacity = capacity
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self._owner_ids = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+        self.invalidations = 0
+
+    def _covers(self, entry, key):
+        owner_id = entry['node']['id']
+        return (key - entry['low']) % self.ring_size <= (owner_id - entry['low']) % self.ring_size
+
+    def _remove(self, owner_id):
+        del self.entries[owner_id]
+        self._owner_ids.pop(bisect_left(self._owner_ids, owner_id))
+
+    def get(self, key, with_replicas=False):
+        """
+        Nodo responsable de key según la caché (None si no hay entrada). Con with_replicas retorna además
+        la lista de réplicas guardada con la entrada.
+        """
+        key %= self.ring_size
+        with self.lock:
+            if self._owner_ids:
+                # El candidato es el primer nodo en cache con id >= key, dando la vuelta al anillo
+                position = bisect_left(self._owner_ids, key)
+                owner_id = self._owner_ids[position % len(self._owner_ids)]
+                entry = self.entries[owner_id]
+                if entry['expires'] < time.monotonic():
+                    self._remove(owner_id)
+                elif self._covers(entry, key):
+                    self.entries.move_to_end(owner_id)
+                    self.hits += 1
+                    return (entry['node'], list(entry['replicas'])) if with_replicas else entry['node']
+            self.misses += 1
+            return (None, []) if with_replicas else None
+
+    def put(self, key, node, replicas=None):
+        key %= self.ring_size
+        with self.lock:
+            entry = self.entries.get(node['id'])
+            if entry is None:
+                entry = {'node': node, 'low': key}
+                self.entries[node['id']] = entry
+                self._owner_ids.insert(bisect_left(self._owner_ids, node['id']), node['id'])
+                if len(self.entries) > self.capacity:
+                    oldest_id = next(iter(self.entries))
+                    self._remove(oldest_id)
+                    self.evictions += 1
+            elif not self._covers(entry, key):
+                entry['low'] = key
+            entry['node'] = node
+            if replicas is not None or 'replicas' not in entry:
+                entry['replicas'] = tuple(replicas or ())
+            entry['expires'] = time.monotonic() + self.ttl
+            self.entries.move_to_end(node['id'])
+
+    def invalidate(self, owner_id=None, stale=False):
+        """
+        Elimina la entrada de owner_id, o todas si no se indica. stale indica que la entrada
+        se descubrió desactualizada al usarla.
+        """
+        with self.lock:
+            if owner_id is None:
+                self.entries.clear()
+                self._owner_ids = []
+            elif owner_id in self.entries:
+                self._remove(owner_id)
+            self.invalidations += 1
+            if stale:
+                self.stale += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'capacity': self.capacity,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'stale': self.stale,
+                'invalidations': self.invalidations
+            }
@@ -1,320 +1,1178 @@
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from tabulate import tabulate
 
+from .cache import OwnerCache
+from .client import NodeClient
+from .handoff import KeyHandoff, ReplicaSync
+from .hashing import hash_key
+from .maintenance import MaintenanceScheduler
+from .metrics import NodeMetrics
+from .routing import FingerTable, NodeRef
+from .storage import (CHUNK_SIZE, MemoryChunkStore, MemoryKeyStore, chunk_digest, chunk_key, keys_digest, read_chunks,
+                      ring_buckets)
+
+logger = logging.getLogger(__name__)
+
+# Espera (en segundos) antes de consultar la siguiente réplica mientras no haya latencias medidas del nodo,
+# y espera máxima aunque el p95 del nodo sea mayor (un nodo que no responde tiene p95 infinito)
+DEFAULT_HEDGE_BUDGET = 0.05
+MAX_HEDGE_BUDGET = 0.5
+# Largo máximo de la lista de sucesores. Con nodos virtuales la lista se alarga hasta incluir replicas + 1
+# procesos distintos, para poder elegir réplicas fuera del proceso de cada nodo
+MAX_SUCCESSORS = 32
+# Tramos en que repair_replicas divide el rango de un nodo para comparar sus claves con las de cada réplica
+REPAIR_BUCKETS = 64
+
+
+def in_interval(x, start, end, inclusive_end=False):
+    """
+    Indica si x pertenece al intervalo circular (start, end), o (start, end] si inclusive_end es True.
+    Si start == end el intervalo cubre todo el anillo (excepto start cuando es abierto).
+    """
+    if start < end:
+        return start < x < end or (inclusive_end and x == end)
+    return x > start or x < end or (inclusive_end and x == end)
+
 
 class ChordNode:
-    def __init__(self, id, port, ip, bits=8):
+    def __init__(self, id, port, ip, bits=8, client=None, storage=None, cache_size=1024, cache_ttl=30.0, process=None,
+                 replicas=2, replica_storage=None, chunk_store=None, chunk_size=CHUNK_SIZE, parallel_chunks=4,
+                 handoff_batch=10000, background_handoff=True):
         self.id = id
         self.port = port
         self.ip = ip  # Guardar la IP del nodo
+        # Dirección del proceso que aloja este nodo; los nodos virtuales de un mismo proceso la comparten
+        self.process = process or f"{ip}:{port}"
+        self.ref = NodeRef(id, port, ip, self.process)
+        # Sucesor y predecesor son NodeRef (None = este mismo nodo / desconocido)
         self.successor = None
         self.predecessor = None
-        self.files = []
-        self.local_files = []
+        # Los siguientes nodos del anillo a partir del sucesor (tupla de NodeRef), mantenida por stabilize
+        self.successor_list = ()
+        # Ids de los nodos que ya confirmaron haber recibido todas las claves de este nodo como réplicas
+        self.replica_targets = set()
+        # Copias en curso o fallidas de claves hacia las réplicas, por (id del nodo destino, inicio, fin)
+        self.replica_syncs = {}
+        # Claves de las que este nodo es responsable (en memoria o persistentes, ver app/storage.py)
+        self.files = storage if storage is not None else MemoryKeyStore()
+        self.local_files = MemoryKeyStore()
+        # Copias de las claves de los predecesores: cada clave se replica en los `replicas` sucesores de su dueño
+        self.replicas = replicas
+        self.replica_files = replica_storage if replica_storage is not None else MemoryKeyStore()
+        # Contenido de los archivos: bloques por digest y manifiestos por file_id (ver app/storage.py)
+        self.chunks = chunk_store if chunk_store is not None else MemoryChunkStore()
+        self.chunk_size = chunk_size
+        # Bloques en tránsito por cada subida o descarga; limita también la memoria usada (parallel_chunks * chunk_size)
+        self.parallel_chunks = parallel_chunks
+        self.transfers = ThreadPoolExecutor(max_workers=parallel_chunks, thread_name_prefix="chunks")
+        # Transferencias de rangos de claves a otros nodos (join y leave) por id del nodo destino
+        self.handoffs = {}
+        self.handoff_batch = handoff_batch
+        # En un anillo simulado las transferencias se ejecutan en el mismo hilo que notify
+        self.background_handoff = background_handoff
+        # Lotes recibidos que se procesan a la vez; con más, el nodo responde 503 y el origen espera
+        self.handoff_slots = threading.BoundedSemaphore(2)
         self.total_bits = bits
+        # Cliente HTTP con pool de conexiones hacia los demás nodos
+        self.client = client if client is not None else NodeClient()
+        # Caché de rangos de claves a nodo responsable para /find_file y /find_batch
+        self.owner_cache = OwnerCache(bits, capacity=cache_size, ttl=cache_ttl)
+        self.metrics = NodeMetrics()
+        # Protege las escrituras de sucesor, predecesor y finger table. Las lecturas no toman el lock:
+        # la finger table se reemplaza completa en cada cambio (copy-on-write) y se lee una sola vez por operación
+        self.lock = threading.RLock()
         self.finger_table = self.create_finger_table()
-        print(f"[DEBUG] Nodo creado con ID {self.id}, IP {self.ip}, y puerto {self.port}")
+        self.next_finger = 0
+        self.scheduler = None
+        logger.debug("Nodo creado con ID %s, IP %s, y puerto %s", self.id, self.ip, self.port)
 
     def create_finger_table(self):
-        finger_table = []
-        for i in range(1, self.total_bits + 1):
-            start = (self.id + 2**(i-1)) % 2**self.total_bits
-            finger_table.append({
-                'start': start,
-                'interval': (start, (start + 2**(i-1)) % 2**self.total_bits),
-                'successor': None
-            })
-        print(f"[DEBUG] Finger table creada para nodo {self.id}: {finger_table}")
-        return finger_table
+        logger.debug("Finger table creada para nodo %s con %s entradas", self.id, self.total_bits)
+        return FingerTable(self.id, self.total_bits)
 
     def update_finger_table(self, index, successor):
         if 0 <= index < len(self.finger_table):
-            self.finger_table[index]['successor'] = successor
-            print(f"[DEBUG] Finger table actualizada en nodo {self.id}, índice {index}, con sucesor {successor['id']}")
+            successor = NodeRef.from_info(successor)
+            with self.lock:
+                self.finger_table = self.finger_table.with_successor(index, successor)
+            logger.debug("Finger table actualizada en nodo %s, índice %s, con sucesor %s", self.id, index, successor.id)
         else:
-            print(f"[DEBUG] Índice {index} fuera de rango para la tabla de dedos en nodo {self.id}")
+            logger.debug("Índice %s fuera de rango para la tabla de dedos en nodo %s", index, self.id)
 
     def show_finger_table(self):
+        finger_table = self.finger_table
         finger_table_data = []
-        for i, entry in enumerate(self.finger_table):
-            successor = entry['successor']
-            successor_id = successor['id'] if successor else None
+        for i in range(len(finger_table)):
+            start, end = finger_table.interval(i)
             finger_table_data.append({
                 'Entry': i+1,
-                'Start': entry['start'],
-                'Interval': f"[{entry['interval'][0]}, {entry['interval'][1]})",
-                'Successor': successor_id
+                'Start': start,
+                'Interval': f"[{start}, {end})",
+                'Successor': finger_table.successor_ids[i]
             })
         return tabulate(finger_table_data, headers="keys", tablefmt="pretty")
 
 
     def update_fingers_with_new_node(self, new_node_id, new_node_port, new_node_ip):
-        print(f"[DEBUG] Actualizando finger table en nodo {self.id} con nuevo nodo {new_node_id}")
-        for i in range(len(self.finger_table)):
-            start = self.finger_table[i]['start']
-            current_successor = self.finger_table[i]['successor']['id'] if self.finger_table[i]['successor'] else None
-            print(f"[DEBUG] Evaluando entrada {i+1} de la finger table con start {start} y sucesor actual {current_successor}")
-
-            # Condición para manejar el rango circular y evitar sobrescritura incorrecta
-            if current_successor is None:
-                if start <= new_node_id or (start > new_node_id and start < self.id):
-                    print(f"[DEBUG] Nodo {new_node_id} es un mejor sucesor para la finger table del nodo {self.id} en índice {i+1}")
-                    self.finger_table[i]['successor'] = {'id': new_node_id, 'port': new_node_port, 'ip': new_node_ip}
-            elif (start <= new_node_id < current_successor) or (current_successor < self.id and (start <= new_node_id or new_node_id < current_successor)):
-                print(f"[DEBUG] Nodo {new_node_id} es un mejor sucesor para la finger table del nodo {self.id} en índice {i+1}")
-                self.finger_table[i]['successor'] = {'id': new_node_id, 'port': new_node_port, 'ip': new_node_ip}
-            else:
-                print(f"[DEBUG] Nodo {new_node_id} no es un mejor sucesor para la entrada {i+1} en la finger table del nodo {self.id}")
-
-    def get_all_nodes(self):
-        nodes = []
-        if self.predecessor:
-            nodes.extend(self.predecessor.get_all_nodes())
-        nodes.append({
-            'id': self.id,
-            'port': self.port,
-            'ip': self.ip  # Añadir la IP del nodo
-        })
-        if self.successor and self.successor.id != self.id:
-            nodes.extend(self.successor.get_all_nodes())
-        print(f"[DEBUG] Nodos en la red vistos por nodo {self.id}: {nodes}")
-        return nodes
-
-
-    def notify_all_nodes(self, new_node_id, new_node_port, new_node_ip):
-        print(f"[DEBUG] Notificando a todos los nodos desde nodo {self.id} sobre nuevo nodo {new_node_id}")
-        all_nodes = self.get_all_nodes()
-        for node in all_nodes:
-                url = f"http://{node['ip']}:{node['port']}/update_finger_table"  # Usar la IP del nodo
-                try:
-                    response = requests.post(url, json={"new_node_id": new_node_id, "new_node_port": new_node_port, "new_node_ip": new_node_ip})
-                    if response.status_code == 200:
-                        print(f"[DEBUG] Finger table en nodo {node['id']} actualizada correctamente.")
-                    else:
-                        print(f"[DEBUG] Error al actualizar finger table en nodo {node['id']}: {response.text}")
-                except requests.exceptions.RequestException as e:
-                    print(f"[DEBUG] Error de conexión al intentar actualizar finger table en nodo {node['id']} ({node['port']}): {e}")
-
+        logger.debug("Actualizando finger table en nodo %s con nuevo nodo %s", self.id, new_node_id)
+        with self.lock:
+            self.finger_table = self.finger_table.with_new_node(NodeRef(new_node_id, new_node_port, new_node_ip))
 
     def store_file(self, node, file_id):
+        """
+        Guarda file_id en node (este nodo o uno remoto). Retorna True si quedó guardado; si el nodo remoto
+        no responde o rechaza la clave lanza requests.exceptions.RequestException.
+        """
+        # Las claves se guardan reducidas al anillo para que handoff y promote_replicas las encuentren por rango
+        file_id %= 2**self.total_bits
         target_node = node
-        print(f"[DEBUG] Intentando almacenar archivo '{file_id}' en nodo {target_node.id} ({target_node.ip}:{target_node.port}) desde nodo {self.id}")
-        
-        if target_node.id != self.id:
-            url = f"http://{target_node.ip}:{target_node.port}/upload"  # Usar la IP del nodo
+        logger.debug("Intentando almacenar archivo '%s' en nodo %s (%s:%s) desde nodo %s", file_id, target_node['id'], target_node['ip'], target_node['port'], self.id)
+
+        if target_node['id'] != self.id:
             try:
-                response = requests.post(url, json={"file_id": file_id})
-                if response.status_code == 200:
-                    print(f"[DEBUG] Archivo '{file_id}' almacenado en nodo {target_node.id} ({target_node.ip}:{target_node.port}).")
-                else:
-                    print(f"[DEBUG] Error al almacenar archivo '{file_id}' en nodo {target_node.id} ({target_node.ip}:{target_node.port}): {response.status_code} - {response.text}")
+                response = self.client.post(target_node, "/upload", json={"file_id": file_id})
             except requests.exceptions.RequestException as e:
-                print(f"[DEBUG] Error al intentar conectarse con nodo {target_node.id} ({target_node.ip}:{target_node.port}): {e}")
-        else:
-            self.files.append(file_id)
-            print(f"[DEBUG] Archivo '{file_id}' almacenado localmente en nodo {self.id} ({self.port}).")
+                logger.warning("Error al intentar conectarse con nodo %s (%s:%s): %s", target_node['id'], target_node['ip'], target_node['port'], e)
+                raise
+            if response.status_code != 200:
+                logger.warning("Error al almacenar archivo '%s' en nodo %s (%s:%s): %s - %s", file_id, target_node['id'], target_node['ip'], target_node['port'], response.status_code, response.text)
+                raise requests.exceptions.RequestException(f"Nodo {target_node['id']} no almacenó el archivo: {response.status_code} {response.text}")
+            logger.debug("Archivo '%s' almacenado en nodo %s (%s:%s).", file_id, target_node['id'], target_node['ip'], target_node['port'])
+            return True
+        if not self.files.add(file_id):
+            logger.debug("Archivo '%s' ya estaba almacenado en nodo %s", file_id, self.id)
+            return True
+        logger.debug("Archivo '%s' almacenado localmente en nodo %s (%s).", file_id, self.id, self.port)
+        self.replicate([file_id])
+        return True
+
+    def node_info(self):
+        return {'id': self.id, 'port': self.port, 'ip': self.ip}
+
+    def find_successor_step(self, file_id, exclude=()):
+        """
+        Un paso de la búsqueda iterativa: indica si este nodo conoce al responsable de file_id
+        ('done' = True) o cuál es el siguiente nodo al que se debe preguntar, sin proponer los ids
+        de exclude (nodos que no respondieron).
+        """
+        file_id %= 2**self.total_bits
+        predecessor, successor = self.predecessor, self.successor
 
-    def find_node(self, file_id):
-        print(f"[DEBUG] Buscando nodo para almacenar archivo '{file_id}' desde nodo {self.id}")
+        if predecessor and in_interval(file_id, predecessor.id, self.id, inclusive_end=True):
+            return {'done': True, 'node': self.node_info(), 'replicas': self.replica_nodes()}
 
-        # Si el predecesor es None (es el primer nodo) o si el file_id es menor que el id del nodo actual,
-        # entonces debe almacenarse en este nodo si no hay un nodo con un id menor.
-        if not self.predecessor or (self.predecessor.id > self.id and (file_id > self.predecessor.id or file_id <= self.id)):
-            print(f"[DEBUG] Archivo '{file_id}' se almacena en nodo {self.id} porque no hay un predecesor más pequeño.")
-            return self
+        successor = successor.node_info() if successor else self.node_info()
+        if in_interval(file_id, self.id, successor['id'], inclusive_end=True):
+            return {'done': True, 'node': successor, 'replicas': self.replica_nodes(skip=1)}
 
-        # Si el file_id es menor que el id del nodo actual pero mayor que el id del predecesor, se almacena aquí.
-        if self.predecessor and self.predecessor.id < file_id <= self.id:
-            print(f"[DEBUG] Archivo '{file_id}' se almacena en nodo {self.id}")
-            return self
+        closest_node = self.find_closest_preceding_node(file_id, exclude)
+        if closest_node.id == self.id:
+            return {'done': True, 'node': successor, 'replicas': self.replica_nodes(skip=1)}
+        return {'done': False, 'node': closest_node.node_info()}
 
-        # Si el file_id es mayor que el id del nodo actual pero menor que el id del sucesor, se almacena en el sucesor.
-        if self.successor and self.id < file_id <= self.successor.id:
-            print(f"[DEBUG] Archivo '{file_id}' se almacena en sucesor {self.successor.id}")
-            return self.successor
+    def replica_nodes(self, skip=0):
+        """
+        Nodos que guardan réplicas de las claves de este nodo (skip=0) o de su sucesor (skip=1), según la lista
+        de sucesores conocida por este nodo: los primeros `replicas` sucesores de procesos distintos entre sí y
+        del proceso del dueño, para que la caída de un proceso (con todos sus nodos virtuales) no se lleve
+        todas las copias. Un sucesor cuyo proceso aún no se conoce cuenta como un proceso distinto.
+        """
+        successors = self.successor_list
+        if skip:
+            if not successors:
+                return []
+            owner, successors = successors[0].process, successors[1:]
+        else:
+            owner = self.process
+        processes = {owner}
+        nodes = []
+        for node in successors:
+            if len(nodes) == self.replicas:
+                break
+            if node.id == self.id or (node.process is not None and node.process in processes):
+                continue
+            processes.add(node.process)
+            nodes.append(node.node_info())
+        return nodes
 
-        # Si no se encuentra un nodo adecuado, continúa la búsqueda en el sucesor.
-        if self.successor and self.successor.id != self.id:
-            print(f"[DEBUG] Redirigiendo la búsqueda del archivo '{file_id}' al sucesor {self.successor.id}")
-            return self.successor.find_node(file_id)
+    def _enough_successors(self, successors):
+        processes = {node.process if node.process is not None else node.id for node in successors}
+        processes.discard(self.process)
+        return len(processes) > self.replicas or len(successors) >= MAX_SUCCESSORS
 
-        # Caso por defecto, almacena en el nodo actual.
-        print(f"[DEBUG] Archivo '{file_id}' se almacena en nodo {self.id} (caso por defecto)")
-        return self
+    def find_successor(self, file_id):
+        """
+        Búsqueda iterativa del nodo responsable de file_id usando las finger tables de cada salto.
+        Retorna el diccionario del nodo responsable y el número de saltos remotos realizados.
+        """
+        step, hops = self.route(file_id)
+        return (step['node'] if step else None), hops
 
-    def find_closest_preceding_node(self, file_id):
+    def route(self, file_id):
         """
-        Revisa la finger table, el nodo actual y el predecesor para encontrar el nodo con el ID inmediato mayor al file_id.
+        Búsqueda iterativa de file_id. Retorna el último paso (con el nodo responsable y sus réplicas)
+        y el número de saltos remotos, o (None, saltos) si la búsqueda falla.
         """
-        print(f"[DEBUG] Revisando finger table en nodo {self.id} para archivo '{file_id}'")
+        file_id %= 2**self.total_bits
+        logger.debug("Buscando sucesor de '%s' desde nodo %s", file_id, self.id)
+        hops = 0
+        step = self.find_successor_step(file_id)
+        visited = {self.id}
+        failed = set()
+        current = None  # Nodo que dio el último paso (None = este nodo)
 
-        # Si el predecesor sigue siendo mayor al file_id, redirigir la búsqueda hacia él
-        if self.predecessor and self.predecessor.id > file_id:
-            print(f"[DEBUG] Redirigiendo la búsqueda al predecesor {self.predecessor.id} porque es mayor al file_id")
-            return self.predecessor.find_closest_preceding_node(file_id)
+        while not step['done']:
+            next_node = step['node']
+            if next_node['id'] in visited or next_node['id'] in failed or hops >= 2 * self.total_bits:
+                # Las finger tables forman un ciclo (o el camino es demasiado largo): el siguiente salto no es
+                # el responsable, así que la búsqueda falla en vez de retornar un nodo equivocado
+                logger.warning("Búsqueda de '%s' sin progreso en nodo %s tras %s saltos, se detiene", file_id, next_node['id'], hops)
+                return None, hops
+
+            try:
+                response = self.client.get(next_node, "/find_successor_step", params=self._step_params(file_id, failed))
+                hops += 1
+                if response.status_code != 200:
+                    logger.warning("Error en paso de búsqueda en nodo %s: %s - %s", next_node['id'], response.status_code, response.text)
+                    return None, hops
+                step = response.json()
+                visited.add(next_node['id'])
+                current = next_node
+                logger.debug("Salto %s hacia nodo %s para archivo '%s'", hops, next_node['id'], file_id)
+            except requests.exceptions.RequestException as e:
+                hops += 1
+                logger.warning("Error al intentar conectarse con nodo %s (%s:%s): %s", next_node['id'], next_node['ip'], next_node['port'], e)
+                # Se le pide al nodo anterior otro camino que no pase por el nodo caído
+                failed.add(next_node['id'])
+                step = self._retry_step(current, file_id, failed)
+                if step is None:
+                    return None, hops
 
-        # Crear una lista de sucesores que sean mayores o iguales a file_id, incluyendo el nodo actual
-        possible_successors = []
+        logger.debug("Nodo responsable de '%s' es %s (%s saltos)", file_id, step['node']['id'], hops)
+        self.metrics.observe_hops(hops)
+        return step, hops
 
-        if self.id >= file_id:
-            possible_successors.append({'id': self.id, 'port': self.port, 'ip': self.ip})
+    @staticmethod
+    def _step_params(file_id, failed):
+        params = {"file_id": file_id}
+        if failed:
+            params["exclude"] = ",".join(str(node_id) for node_id in sorted(failed))
+        return params
 
-        for finger in self.finger_table:
-            successor_id = finger['successor']['id'] if finger['successor'] else None
+    def _retry_step(self, current, file_id, failed):
+        if current is None:
+            return self.find_successor_step(file_id, failed)
+        try:
+            response = self.client.get(current, "/find_successor_step", params=self._step_params(file_id, failed))
+            return response.json() if response.status_code == 200 else None
+        except requests.exceptions.RequestException as e:
+            logger.warning("Error al intentar conectarse con nodo %s (%s:%s): %s", current['id'], current['ip'], current['port'], e)
+            return None
 
-            if successor_id is not None and successor_id >= file_id:
-                possible_successors.append(finger['successor'])
+    def find_closest_preceding_node(self, file_id, exclude=()):
+        """
+        Busca en la finger table (con bisect sobre la distancia desde este nodo) y en el sucesor
+        el nodo conocido que más precede a file_id en el anillo, sin contar los ids de exclude. Retorna un NodeRef.
+        """
+        closest_node = self.finger_table.closest_preceding(file_id, exclude)
+        if closest_node is not None:
+            logger.debug("Nodo más cercano encontrado: %s", closest_node.id)
+            return closest_node
 
-        if possible_successors:
-            # Encontrar el menor de los sucesores mayores o iguales a file_id
-            closest_successor = min(possible_successors, key=lambda x: x['id'])
-            print(f"[DEBUG] Nodo más cercano encontrado: {closest_successor['id']}")
-            return closest_successor
+        successor = self.successor
+        if successor and successor.id not in exclude and in_interval(successor.id, self.id, file_id):
+            logger.debug("Nodo más cercano encontrado: sucesor %s", successor.id)
+            return successor
 
         # Si no se encuentra ningún nodo adecuado, retornar el nodo actual
-        print(f"[DEBUG] No se encontraron sucesores adecuados, utilizando el nodo actual {self.id}")
-        return {'id': self.id, 'port': self.port, 'ip': self.ip}
+        logger.debug("No se encontraron nodos precedentes, utilizando el nodo actual %s", self.id)
+        return self.ref
 
     def store_file_via_finger_table(self, file_id):
         """
-        Utiliza la finger table para encontrar el nodo más cercano y almacena el archivo allí.
+        Utiliza la finger table para encontrar el nodo responsable y almacena el archivo allí. Retorna el nodo
+        (None si la búsqueda falló) y los saltos; si el responsable no guarda el archivo lanza la excepción de store_file.
         """
-        print(f"[DEBUG] Iniciando proceso para almacenar archivo '{file_id}' utilizando la finger table desde nodo {self.id}")
-        
-        # Encuentra el nodo más cercano utilizando la finger table
-        closest_node_info = self.find_closest_preceding_node(file_id)
-        
-        # Convertir el diccionario en un objeto ChordNode si es necesario
-        if isinstance(closest_node_info, dict):
-            closest_node = ChordNode(closest_node_info['id'], closest_node_info['port'], closest_node_info['ip'])
-        else:
-            closest_node = closest_node_info
-        
-        # Si el nodo más cercano no es el mismo nodo actual
-        if closest_node.id != self.id:
-            print(f"[DEBUG] El nodo más cercano para almacenar el archivo '{file_id}' es {closest_node.id} ({closest_node.ip}:{closest_node.port})")
-        else:
-            print(f"[DEBUG] El nodo actual {self.id} es el mejor candidato para almacenar el archivo '{file_id}'")
-        
-        # Encuentra el nodo exacto donde se debe almacenar el archivo
-        target_node = closest_node.find_node(file_id)
-        print(f"[DEBUG] Nodo objetivo para almacenar archivo '{file_id}' es {target_node.id} ({target_node.ip}:{target_node.port})")
-        
+        logger.debug("Iniciando proceso para almacenar archivo '%s' utilizando la finger table desde nodo %s", file_id, self.id)
+
+        target_node, hops = self.find_successor(file_id)
+        if target_node is None:
+            return None, hops
+        logger.debug("Nodo objetivo para almacenar archivo '%s' es %s (%s:%s)", file_id, target_node['id'], target_node['ip'], target_node['port'])
+
         # Almacena el archivo en el nodo correcto
         self.store_file(target_node, file_id)
+        return target_node, hops
+
+    def lookup_owner(self, file_id, use_cache=True):
+        """
+        Consulta primero la caché de nodos responsables y solo si no hay entrada hace la búsqueda en el anillo.
+        Retorna el nodo, los saltos realizados y si el resultado vino de la caché.
+        """
+        if use_cache:
+            target_node = self.owner_cache.get(file_id)
+            if target_node is not None:
+                logger.debug("Nodo responsable de '%s' encontrado en caché: %s", file_id, target_node['id'])
+                return target_node, 0, True
+
+        target_node, hops = self.find_successor(file_id)
+        if target_node is not None:
+            self.owner_cache.put(file_id, target_node)
+        return target_node, hops, False
+
+    def lookup_replicas(self, file_id, use_cache=True):
+        """
+        Como lookup_owner, pero retorna la lista [dueño, réplicas...] de nodos que tienen file_id.
+        """
+        if use_cache:
+            target_node, replicas = self.owner_cache.get(file_id, with_replicas=True)
+            if target_node is not None:
+                return [target_node] + replicas, 0, True
+
+        step, hops = self.route(file_id)
+        if step is None:
+            return [], hops, False
+        replicas = step.get('replicas', [])
+        self.owner_cache.put(file_id, step['node'], replicas)
+        return [step['node']] + replicas, hops, False
+
+    def is_responsible(self, file_id):
+        predecessor = self.predecessor
+        if not predecessor:
+            return True
+        return in_interval(file_id % 2**self.total_bits, predecessor.id, self.id, inclusive_end=True)
+
+    def hedge_budget(self, node):
+        return min(self.client.latency_quantile(node, 0.95) or DEFAULT_HEDGE_BUDGET, MAX_HEDGE_BUDGET)
+
+    def check_replicas(self, nodes, file_id):
+        """
+        Pregunta por file_id al dueño (nodes[0]) y, si no contesta dentro del p95 de su latencia, también a la
+        siguiente réplica, y así sucesivamente. Retorna (existe, es_responsable, nodo que respondió); la
+        responsabilidad solo la informa el dueño, y (None, None, dueño) si ningún nodo respondió.
+        """
+        owner = nodes[0]
+        node, response, answers = self.client.hedge(
+            nodes,
+            lambda node: self.client.get(node, "/check_file", params={"file_id": file_id}),
+            lambda response: response.status_code == 200 and response.json().get("exists", False),
+            self.hedge_budget(owner)
+        )
+        if len(answers) > 1 or node not in (None, owner):
+            self.metrics.increment('hedged_reads')
+        if node is not None:
+            return True, True, node
+
+        for node, response in answers:
+            if node is owner and response is not None and response.status_code == 200:
+                return False, response.json().get("responsible", True), owner
+        if not any(response is not None for _, response in answers):
+            logger.warning("Ninguna réplica de '%s' respondió: %s", file_id, [node['id'] for node in nodes])
+            return None, None, owner
+        return False, True, owner
 
     def find_and_store_local_file(self, file_id):
         """
-        Utiliza la finger table para encontrar el nodo que tiene el archivo y lo almacena en local_files si está en el nodo actual.
+        Encuentra el nodo que tiene el archivo (usando la caché o la finger table) y lo almacena en local_files si existe.
+        La lectura se hace con peticiones escalonadas al dueño y a sus réplicas (ver check_replicas).
+        """
+        logger.debug("Iniciando proceso para encontrar archivo '%s' en la red desde nodo %s", file_id, self.id)
+
+        nodes, hops, cached = self.lookup_replicas(file_id)
+        if not nodes:
+            return None, None, hops
+        logger.debug("Nodos para buscar archivo '%s': %s", file_id, [node['id'] for node in nodes])
+
+        exists, responsible, target_node = self.check_replicas(nodes, file_id)
+        if cached and not responsible:
+            # La entrada de la caché quedó desactualizada: se descarta y se vuelve a enrutar una sola vez
+            logger.debug("Entrada de caché desactualizada para '%s' en nodo %s, re-enrutando", file_id, target_node['id'])
+            self.owner_cache.invalidate(target_node['id'], stale=True)
+            nodes, extra_hops, _ = self.lookup_replicas(file_id, use_cache=False)
+            hops += extra_hops
+            if not nodes:
+                return None, None, hops
+            exists, responsible, target_node = self.check_replicas(nodes, file_id)
+
+        if exists:
+            logger.debug("Archivo '%s' encontrado en nodo %s (%s:%s)", file_id, target_node['id'], target_node['ip'], target_node['port'])
+            self.local_files.add(file_id)
+            logger.debug("Archivo '%s' añadido a local_files en nodo %s", file_id, self.id)
+            return target_node['id'], target_node['port'], hops
+
+        logger.debug("Archivo '%s' no encontrado en nodo %s (%s:%s)", file_id, target_node['id'], target_node['ip'], target_node['port'])
+        return None, None, hops
+
+    def resolve_owners(self, file_ids, use_cache=False):
+        """
+        Agrupa file_ids por nodo responsable. Si el nodo O es responsable de la clave k, también lo es de
+        todas las claves en [k, O], así que se hace una sola búsqueda por cada rango contiguo de claves.
+        Retorna los grupos por nodo, las claves cuya búsqueda falló y el total de saltos.
+        """
+        ring_size = 2**self.total_bits
+        by_key = {}
+        for file_id in file_ids:
+            by_key.setdefault(file_id % ring_size, []).append(file_id)
+
+        groups = {}
+        failed = []
+        total_hops = 0
+        current_start, current_owner = None, None
+        for key in sorted(by_key):
+            if current_owner is None or key - current_start > (current_owner['id'] - current_start) % ring_size:
+                current_owner, hops, _ = self.lookup_owner(key, use_cache=use_cache)
+                current_start = key
+                total_hops += hops
+                if current_owner is None:
+                    failed.extend(by_key[key])
+                    continue
+            group = groups.setdefault(current_owner['id'], {'node': current_owner, 'file_ids': []})
+            group['file_ids'].extend(by_key[key])
+
+        logger.debug("%s archivos agrupados en %s nodos con %s saltos", len(file_ids), len(groups), total_hops)
+        return list(groups.values()), failed, total_hops
+
+    def store_local_files(self, file_ids):
+        ring_size = 2**self.total_bits
+        file_ids = [file_id % ring_size for file_id in file_ids]
+        added = self.files.add_many(file_ids)
+        logger.debug("%s archivos nuevos almacenados localmente en nodo %s (%s).", added, self.id, self.port)
+        self.replicate(file_ids)
+        return added
+
+    def replicate(self, file_ids, nodes=None):
+        """
+        Copia file_ids (con sus manifiestos) en las réplicas de este nodo (o en nodes), en lotes de handoff_batch
+        claves por petición /replicate. Las copias que fallan las repara después repair_replicas.
+        """
+        nodes = self.replica_nodes() if nodes is None else nodes
+        file_ids = list(file_ids)
+        if not file_ids or not nodes:
+            return
+        for start in range(0, len(file_ids), self.handoff_batch):
+            batch = file_ids[start:start + self.handoff_batch]
+            body = {"file_ids": batch, "manifests": self.chunks.manifests_for(batch)}
+            report = self.client.fan_out(nodes, lambda node: self.client.post(node, "/replicate", json=body))
+            for entry in report:
+                if not entry['success']:
+                    logger.warning("Error al replicar %s claves en nodo %s (%s:%s): %s", len(batch), entry['id'], entry['ip'], entry['port'], entry['error'])
+
+    def store_replicas(self, file_ids, manifests=()):
+        self.store_manifests(manifests)
+        return self.replica_files.add_many(file_ids)
+
+    def store_manifests(self, manifests):
+        for manifest in manifests:
+            self.chunks.put_manifest(int(manifest['file_id']) % 2**self.total_bits, manifest)
+
+    def replica_digests(self, buckets):
+        """
+        Resumen (cantidad y SHA-1) de las copias guardadas en cada tramo (inicio, fin] de buckets.
         """
-        print(f"[DEBUG] Iniciando proceso para encontrar archivo '{file_id}' en la red desde nodo {self.id}")
-        
-        current_node = self
-        # Bucle para redirigir la búsqueda al predecesor real si es necesario
-        while current_node.predecessor:
-            print(f"[DEBUG] Consultando predecesor {current_node.predecessor.id} para archivo '{file_id}'")
-            url = f"http://{current_node.predecessor.ip}:{current_node.predecessor.port}/check_predecessor"  # Usar la IP del predecesor
+        return [keys_digest(self.replica_files.range(start, end)) for start, end in buckets]
+
+    def start_replica_sync(self, target, start=None, end=None, background=None):
+        """
+        Copia en target, por lotes, las claves de (start, end] (por defecto, todas las de este nodo), o retoma la
+        copia fallida hacia target del mismo rango. Cuando la copia completa termina, target pasa a replica_targets.
+        """
+        full = start is None
+        if full:
+            start = end = self.id
+        key = (target['id'], start, end)
+        with self.lock:
+            sync = self.replica_syncs.get(key)
+            if sync is not None and sync.state in ('pending', 'running'):
+                return sync
+            if sync is None:
+                sync = self.replica_syncs[key] = ReplicaSync(self, target, start, end, self.handoff_batch)
+            sync.state = 'pending'
+
+        def run():
+            if not sync.run():
+                return
+            with self.lock:
+                self.replica_syncs.pop(key, None)
+                # Si target dejó de ser réplica mientras tanto, vuelve a recibir todo si regresa
+                if full and any(node['id'] == target['id'] for node in self.replica_nodes()):
+                    self.replica_targets.add(target['id'])
+
+        if self.background_handoff if background is None else background:
+            threading.Thread(target=run, name=f"replica-sync-{target['id']}", daemon=True).start()
+        else:
+            run()
+        return sync
+
+    def repair_replicas(self, buckets=REPAIR_BUCKETS):
+        """
+        Anti-entropía: compara por tramos (cantidad y SHA-1) las claves de (predecesor, este nodo] con las copias
+        de cada réplica y vuelve a enviar los tramos distintos, p. ej. las claves de un replicate que la réplica
+        no recibió. Retorna la cantidad de tramos reenviados.
+        """
+        with self.lock:
+            predecessor = self.predecessor
+            targets = [node for node in self.replica_nodes() if node['id'] in self.replica_targets]
+        # Sin predecesor el rango propio es incierto
+        if predecessor is None or not targets:
+            return 0
+        bounds = ring_buckets(predecessor.id, self.id, buckets, 2**self.total_bits)
+        local = [keys_digest(self.files.range(start, end)) for start, end in bounds]
+        repaired = 0
+        for node in targets:
             try:
-                response = requests.get(url, params={"file_id": file_id})
-                if response.status_code == 200 and response.json().get("continue_search"):
-                    print(f"[DEBUG] Redirigiendo la búsqueda al predecesor {current_node.predecessor.id} ({current_node.predecessor.ip}:{current_node.predecessor.port})")
-                    current_node = ChordNode(response.json()["predecessor_id"], response.json()["predecessor_port"], response.json()["predecessor_ip"])
-                else:
-                    print(f"[DEBUG] No se necesita redirigir la búsqueda al predecesor {current_node.predecessor.id}")
-                    break
+                response = self.client.post(node, "/replica_digest", json={"buckets": bounds})
+                if response.status_code != 200:
+                    logger.warning("Réplica %s no entregó su resumen al nodo %s: %s", node['id'], self.id, response.text)
+                    continue
+                remote = response.json()['digests']
             except requests.exceptions.RequestException as e:
-                print(f"[DEBUG] Error al intentar conectarse con predecesor {current_node.predecessor.id} ({current_node.predecessor.port}): {e}")
-                break
+                logger.warning("Réplica %s no responde al nodo %s: %s", node['id'], self.id, e)
+                continue
+            for (start, end), mine, theirs in zip(bounds, local, remote):
+                # Solo se reenvían tramos con claves; las copias sobrantes en la réplica no se borran
+                if mine[0] and list(theirs) != mine:
+                    self.start_replica_sync(node, start, end, background=False)
+                    repaired += 1
+        if repaired:
+            self.metrics.increment('replica_ranges_repaired', repaired)
+            logger.info("Nodo %s reenvió %s tramos de claves a sus réplicas", self.id, repaired)
+        return repaired
 
-        # Una vez que se ha determinado el nodo correcto para comenzar la búsqueda,
-        # continuar con la lógica existente de encontrar el nodo más cercano en la finger table
-        closest_node_info = current_node.find_closest_preceding_node(file_id)
-        
-        if isinstance(closest_node_info, dict):
-            closest_node = ChordNode(closest_node_info['id'], closest_node_info['port'], closest_node_info['ip'])
-        else:
-            closest_node = closest_node_info
-        
-        if closest_node.id != self.id:
-            print(f"[DEBUG] El nodo más cercano para buscar el archivo '{file_id}' es {closest_node.id} ({closest_node.ip}:{closest_node.port})")
-        else:
-            print(f"[DEBUG] El nodo actual {self.id} es el mejor candidato para buscar el archivo '{file_id}'")
-        
-        target_node = closest_node.find_node(file_id)
-        print(f"[DEBUG] Nodo objetivo para buscar archivo '{file_id}' es {target_node.id} ({target_node.ip}:{target_node.port})")
-        
-        try:
-            url = f"http://{target_node.ip}:{target_node.port}/check_file"  # Usar la IP del nodo
-            response = requests.get(url, params={"file_id": file_id})
-            if response.status_code == 200 and response.json().get("exists"):
-                print(f"[DEBUG] Archivo '{file_id}' encontrado en nodo {target_node.id} ({target_node.ip}:{target_node.port})")
-                self.local_files.append(file_id)
-                print(f"[DEBUG] Archivo '{file_id}' añadido a local_files en nodo {self.id}")
-                return target_node.id, target_node.port
+    def promote_replicas(self):
+        """
+        Pasa a files las réplicas del rango (predecesor, este nodo]: pasa cuando el predecesor cae y este nodo
+        hereda su rango. Las claves promovidas se replican en los sucesores de este nodo.
+        """
+        predecessor = self.predecessor
+        if predecessor is None:
+            return 0
+        file_ids = self.replica_files.range(predecessor.id, self.id)
+        if not file_ids:
+            return 0
+        self.files.add_many(file_ids)
+        self.replica_files.remove_many(file_ids)
+        logger.info("Nodo %s asume %s claves replicadas del rango (%s, %s]", self.id, len(file_ids), predecessor.id, self.id)
+        self.replicate(file_ids)
+        return len(file_ids)
+
+    def store_files_batch(self, file_ids):
+        """
+        Almacena un lote de archivos enviando una sola petición /store_batch por cada nodo responsable.
+        Retorna el resultado por archivo y el total de saltos de enrutamiento.
+        """
+        groups, failed, hops = self.resolve_owners(file_ids)
+        results = {file_id: {'success': False, 'node': None, 'error': "No se encontró el nodo responsable"} for file_id in failed}
+
+        remote_groups = []
+        for group in groups:
+            if group['node']['id'] == self.id:
+                self.store_local_files(group['file_ids'])
+                results.update({file_id: {'success': True, 'node': group['node']} for file_id in group['file_ids']})
             else:
-                print(f"[DEBUG] Archivo '{file_id}' no encontrado en nodo {target_node.id} ({target_node.ip}:{target_node.port})")
-                return None, None
-        except requests.exceptions.RequestException as e:
-            print(f"[DEBUG] Error al intentar conectarse con nodo {target_node.id} ({target_node.ip}:{target_node.port}): {e}")
-            return None, None
+                remote_groups.append(group)
+
+        file_ids_by_node = {group['node']['id']: group['file_ids'] for group in remote_groups}
+        report = self.client.fan_out(
+            [group['node'] for group in remote_groups],
+            lambda node: self.client.post(node, "/store_batch", json={"file_ids": file_ids_by_node[node['id']]})
+        )
+        for entry in report:
+            node = {'id': entry['id'], 'port': entry['port'], 'ip': entry['ip']}
+            result = {'success': entry['success'], 'node': node}
+            if not entry['success']:
+                logger.warning("Error al almacenar lote en nodo %s (%s:%s): %s", entry['id'], entry['ip'], entry['port'], entry['error'])
+                result['error'] = entry['error']
+            results.update({file_id: result for file_id in file_ids_by_node[entry['id']]})
+
+        return [dict(results[file_id], file_id=file_id) for file_id in file_ids], hops
+
+    def find_files_batch(self, file_ids, use_cache=True):
+        """
+        Busca un lote de archivos con una sola petición /check_batch por cada nodo responsable.
+        Los archivos encontrados se añaden a local_files. Las claves que un nodo sacado de la caché
+        ya no tiene a cargo se vuelven a enrutar una sola vez sin caché.
+        """
+        groups, failed, hops = self.resolve_owners(file_ids, use_cache=use_cache)
+        results = {file_id: {'exists': False, 'node': None} for file_id in failed}
+
+        rerouted = []
+        remote_groups = []
+        for group in groups:
+            if group['node']['id'] == self.id:
+                rerouted.extend(self.foreign_files(group['file_ids']))
+                found = set(self.check_local_files(group['file_ids']))
+                results.update({file_id: {'exists': file_id in found, 'node': group['node']} for file_id in group['file_ids']})
+            else:
+                remote_groups.append(group)
+
+        file_ids_by_node = {group['node']['id']: group['file_ids'] for group in remote_groups}
+        report = self.client.fan_out(
+            [group['node'] for group in remote_groups],
+            lambda node: self.client.post(node, "/check_batch", json={"file_ids": file_ids_by_node[node['id']]})
+        )
+        for entry in report:
+            node = {'id': entry['id'], 'port': entry['port'], 'ip': entry['ip']}
+            data = entry['response'].json() if entry['success'] else {}
+            found = set(data.get('exists', []))
+            if data.get('not_responsible'):
+                rerouted.extend(data['not_responsible'])
+                self.owner_cache.invalidate(entry['id'], stale=True)
+            if not entry['success']:
+                logger.warning("Error al buscar lote en nodo %s (%s:%s): %s", entry['id'], entry['ip'], entry['port'], entry['error'])
+            results.update({file_id: {'exists': file_id in found, 'node': node} for file_id in file_ids_by_node[entry['id']]})
+
+        if rerouted and use_cache:
+            retried, extra_hops = self.find_files_batch(rerouted, use_cache=False)
+            hops += extra_hops
+            results.update({result['file_id']: result for result in retried})
+
+        self.local_files.add_many(file_id for file_id in file_ids if results[file_id]['exists'])
+        return [dict(results[file_id], file_id=file_id) for file_id in file_ids], hops
+
+    def store_chunk(self, digest, data, replicate=True):
+        """
+        Guarda un bloque de contenido y, si replicate es True, lo copia en las réplicas de este nodo.
+        """
+        added = self.chunks.put(digest, data)
+        if replicate:
+            report = self.client.fan_out(self.replica_nodes(), lambda node: self.client.put_data(node, "/replicate_chunk", data, params={"digest": digest}))
+            for entry in report:
+                if not entry['success']:
+                    logger.warning("Error al replicar el bloque %s en nodo %s (%s:%s): %s", digest, entry['id'], entry['ip'], entry['port'], entry['error'])
+        return added
+
+    def store_manifest(self, manifest, replicate=True):
+        """
+        Guarda el manifiesto de un archivo y registra su file_id como clave de este nodo (o como réplica).
+        """
+        file_id = int(manifest['file_id']) % 2**self.total_bits
+        self.chunks.put_manifest(file_id, manifest)
+        if not replicate:
+            self.store_replicas([file_id])
+            return
+        self.files.add(file_id)
+        # replicate envía la clave junto con su manifiesto
+        self.replicate([file_id])
+
+    def send_to_owner(self, file_id, send):
+        """
+        Ejecuta send(nodo) con el responsable de file_id o, si no responde, con sus réplicas en orden.
+        Una entrada de caché desactualizada (el nodo responde que no es responsable) se re-enruta una vez.
+        Retorna el nodo que aceptó la petición, o None.
+        """
+        for use_cache in (True, False):
+            nodes, _, cached = self.lookup_replicas(file_id, use_cache=use_cache)
+            for node in nodes:
+                try:
+                    response = send(node)
+                except requests.exceptions.RequestException as e:
+                    logger.warning("Error al enviar '%s' al nodo %s (%s:%s): %s", file_id, node['id'], node['ip'], node['port'], e)
+                    continue
+                if response.status_code != 200:
+                    logger.warning("El nodo %s rechazó '%s': %s", node['id'], file_id, response.text)
+                    continue
+                if cached and not response.json().get('responsible', True):
+                    self.owner_cache.invalidate(node['id'], stale=True)
+                    break
+                return node
+            else:
+                return None
+        return None
+
+    def put_chunk(self, digest, data):
+        key = chunk_key(digest, self.total_bits)
+        return self.send_to_owner(key, lambda node: self.client.put_data(node, "/store_chunk", data, params={"digest": digest}))
+
+    def get_chunk(self, digest):
+        """
+        Descarga un bloque del responsable o, con peticiones escalonadas, de sus réplicas. El contenido se
+        verifica con su digest; un bloque corrupto cuenta como no encontrado. Retorna los bytes o None.
+        """
+        key = chunk_key(digest, self.total_bits)
+        for use_cache in (True, False):
+            nodes, _, _ = self.lookup_replicas(key, use_cache=use_cache)
+            if not nodes:
+                continue
+            _, response, _ = self.client.hedge(
+                nodes,
+                lambda node: self.client.get(node, "/chunk", params={"digest": digest}),
+                lambda response: response.status_code == 200 and chunk_digest(response.content) == digest,
+                self.hedge_budget(nodes[0])
+            )
+            if response is not None:
+                return response.content
+            self.owner_cache.invalidate(nodes[0]['id'], stale=True)
+        return None
+
+    def get_manifest(self, file_name):
+        file_id = hash_key(file_name, self.total_bits)
+        for use_cache in (True, False):
+            nodes, _, _ = self.lookup_replicas(file_id, use_cache=use_cache)
+            if not nodes:
+                continue
+            _, response, _ = self.client.hedge(
+                nodes,
+                lambda node: self.client.get(node, "/manifest", params={"file_id": file_id}),
+                lambda response: response.status_code == 200,
+                self.hedge_budget(nodes[0])
+            )
+            if response is not None:
+                return response.json()
+        return None
+
+    def upload_content(self, file_name, stream):
+        """
+        Divide stream en bloques de chunk_size bytes, envía cada bloque al responsable de su digest (hasta
+        parallel_chunks a la vez) y al final guarda el manifiesto del archivo en el responsable de file_name.
+        Retorna el manifiesto, o None si algún bloque o el manifiesto no se pudo guardar.
+        """
+        file_id = hash_key(file_name, self.total_bits)
+        digests = []
+        size = 0
+        pending = deque()
+        failed = False
+        for data in read_chunks(stream, self.chunk_size):
+            digest = chunk_digest(data)
+            digests.append(digest)
+            size += len(data)
+            pending.append(self.transfers.submit(self.put_chunk, digest, data))
+            # Con parallel_chunks bloques en vuelo se espera al más antiguo antes de leer el siguiente
+            if len(pending) >= self.parallel_chunks:
+                failed |= pending.popleft().result() is None
+        failed |= any(future.result() is None for future in pending)
+        if failed:
+            logger.warning("No se pudieron guardar todos los bloques de '%s'", file_name)
+            return None
+
+        manifest = {'file_name': file_name, 'file_id': file_id, 'size': size, 'chunk_size': self.chunk_size, 'chunks': digests}
+        node = self.send_to_owner(file_id, lambda node: self.client.post(node, "/store_manifest", json={"manifest": manifest}))
+        if node is None:
+            return None
+        self.metrics.increment('files_uploaded')
+        return manifest
+
+    def read_content(self, manifest, start=0, end=None):
+        """
+        Generador con los bytes [start, end) del archivo descrito por manifest. Descarga hasta parallel_chunks
+        bloques por adelantado y los entrega en orden; lanza IOError si un bloque no está en ningún nodo.
+        """
+        end = manifest['size'] if end is None else end
+        chunk_size = manifest['chunk_size']
+        digests = manifest['chunks']
+        indexes = iter(range(start // chunk_size, (end + chunk_size - 1) // chunk_size))
+        pending = deque()
+
+        def fetch_next():
+            index = next(indexes, None)
+            if index is not None:
+                pending.append((index, self.transfers.submit(self.get_chunk, digests[index])))
+
+        for _ in range(self.parallel_chunks):
+            fetch_next()
+        try:
+            while pending:
+                index, future = pending.popleft()
+                data = future.result()
+                fetch_next()
+                if data is None:
+                    raise IOError(f"Bloque {index} ({digests[index]}) de '{manifest['file_name']}' no disponible")
+                offset = index * chunk_size
+                yield data[max(start - offset, 0):end - offset]
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def check_local_files(self, file_ids):
+        ring_size = 2**self.total_bits
+        return [file_id for file_id in file_ids if file_id % ring_size in self.files]
+
+    def foreign_files(self, file_ids):
+        return [file_id for file_id in file_ids if not self.is_responsible(file_id)]
+
+    def neighbours(self):
+        """
+        Predecesor (o None) y sucesor de este nodo, leídos juntos para no mezclar dos estados del anillo.
+        """
+        with self.lock:
+            predecessor, successor = self.predecessor, self.successor
+        return (predecessor.node_info() if predecessor else None,
+                successor.node_info() if successor else self.node_info())
+
+    def node_state(self):
+        predecessor, successor = self.neighbours()
+        return {
+            'id': self.id,
+            'port': self.port,
+            'ip': self.ip,
+            'predecessor': predecessor,
+            'successor': successor,
+            'files': list(self.files),
+            'local_files': list(self.local_files)
+        }
+
+    def node_load(self):
+        _, successor = self.neighbours()
+        return {
+            'id': self.id,
+            'port': self.port,
+            'ip': self.ip,
+            'process': self.process,
+            'successor': successor,
+            'keys': len(self.files),
+            'replicas': len(self.replica_files)
+        }
+
+    def walk_ring(self, path, state):
+        """
+        Recorre el anillo siguiendo los sucesores a partir de este nodo (cuyo estado es state) y retorna
+        la respuesta de path de cada nodo visitado.
+        """
+        states = []
+        visited = set()
+        while state['id'] not in visited and len(visited) < 2**self.total_bits:
+            visited.add(state['id'])
+            states.append(state)
+            try:
+                response = self.client.get(state['successor'], path)
+                if response.status_code != 200:
+                    break
+                state = response.json()
+            except requests.exceptions.RequestException as e:
+                logger.warning("Error al recorrer el anillo en nodo %s: %s", state['successor']['id'], e)
+                break
+        return states
 
     def show(self):
-            result = []
-            if self.predecessor:
-                result.extend(self.predecessor.show())
-            result.append(f"{self.id} ({self.ip}:{self.port}) - Archivos-red: {self.files} - Archivos-local: {self.local_files}")
-            if self.successor:
-                result.extend(self.successor.show())
-            return result
+        return [
+            f"{state['id']} ({state['ip']}:{state['port']}) - Archivos-red: {state['files']} - Archivos-local: {state['local_files']}"
+            for state in self.walk_ring("/node_state", self.node_state())
+        ]
 
+    def balance(self):
+        """
+        Fracción del espacio de claves y cantidad de claves de cada nodo del anillo y de cada proceso
+        (la suma de sus nodos virtuales). Un max_share_ratio de 1 indica un reparto perfecto.
+        """
+        ring_size = 2**self.total_bits
+        states = sorted(self.walk_ring("/node_load", self.node_load()), key=lambda state: state['id'])
+        nodes = []
+        processes = {}
+        for position, state in enumerate(states):
+            owned = (state['id'] - states[position - 1]['id']) % ring_size or ring_size
+            nodes.append({'id': state['id'], 'port': state['port'], 'ip': state['ip'], 'process': state['process'],
+                          'share': owned / ring_size, 'keys': state['keys'], 'replicas': state.get('replicas', 0)})
+            process = processes.setdefault(state['process'], {'process': state['process'], 'virtual_nodes': 0, 'share': 0.0, 'keys': 0})
+            process['virtual_nodes'] += 1
+            process['share'] += owned / ring_size
+            process['keys'] += state['keys']
+
+        processes = list(processes.values())
+        keys = [process['keys'] for process in processes]
+        mean_keys = sum(keys) / len(keys)
+        return {
+            'nodes': nodes,
+            'processes': processes,
+            'summary': {
+                'nodes': len(nodes),
+                'processes': len(processes),
+                'keys': sum(keys),
+                'max_share_ratio': max(node['share'] for node in nodes) * len(nodes),
+                'max_process_share_ratio': max(process['share'] for process in processes) * len(processes),
+                # Coeficiente de variación de las claves por proceso (0 = todos guardan lo mismo)
+                'process_keys_cv': statistics.pstdev(keys) / mean_keys if mean_keys else 0.0
+            }
+        }
 
     def join(self, node_info):
+        """
+        Une este nodo al anillo a través de un nodo conocido: solo se busca el sucesor de este nodo.
+        El predecesor, los demás nodos y la finger table se ajustan con stabilize y fix_fingers.
+        """
         node_id, node_port, node_ip = node_info
+        logger.debug("Nodo %s uniéndose al anillo a través de %s (%s:%s)", self.id, node_id, node_ip, node_port)
+
+        try:
+            if node_id is None:
+                # Con ids calculados por hash basta con la dirección del nodo conocido
+                response = self.client.get({'port': node_port, 'ip': node_ip}, "/ping")
+                if response.status_code != 200:
+                    return {'success': False, 'error': response.text}
+                node_id = response.json()['id']
+            if node_id == self.id:
+                if (node_ip, int(node_port)) != (self.ip, self.port):
+                    return self.id_conflict({'id': node_id, 'port': node_port, 'ip': node_ip})
+                # Unirse a través de sí mismo: el nodo forma un anillo de un solo nodo
+                return {'success': True, 'successor': self.node_info(), 'hops': 0}
+            response = self.client.get({'id': node_id, 'port': node_port, 'ip': node_ip}, "/find_successor", params={"file_id": self.id})
+        except requests.exceptions.RequestException as e:
+            logger.warning("Error al intentar conectarse con nodo %s (%s:%s): %s", node_id, node_ip, node_port, e)
+            return {'success': False, 'error': str(e)}
+        if response.status_code != 200:
+            return {'success': False, 'error': response.text}
 
-        print(f"[DEBUG] Nodo {self.id} uniéndose a {node_id} ({node_ip}:{node_port})")
+        successor = response.json()['node']
+        if successor['id'] == self.id and (successor['ip'], successor['port']) != (self.ip, self.port):
+            # Otro nodo del anillo ya tiene este id (colisión del hash con pocos bits)
+            return self.id_conflict(successor)
+        with self.lock:
+            self.predecessor = None
+            self.set_successor(successor)
+        # Avisar de inmediato al sucesor en vez de esperar a la primera ronda de stabilize
+        self.stabilize()
+        return {'success': True, 'successor': successor, 'hops': response.json()['hops'] + 1}
 
-        if self.id == node_id or (self.successor and self.successor.id == node_id) or (self.predecessor and self.predecessor.id == node_id):
-            print(f"[DEBUG] Nodo {self.id} ya está conectado a {node_id}, evitando recursión")
+    def id_conflict(self, other):
+        logger.error("El id %s de nodo %s:%s ya lo usa el nodo %s:%s; use más --bits o un node_id explícito",
+                     self.id, self.ip, self.port, other['ip'], other['port'])
+        return {'success': False, 'conflict': True,
+                'error': f"El id {self.id} ya lo usa el nodo {other['ip']}:{other['port']}"}
+
+    def set_successor(self, node):
+        node = NodeRef.from_info(node)
+        with self.lock:
+            self.successor = None if node.id == self.id else node
+            if self.successor is not None:
+                self.finger_table = self.finger_table.with_new_node(node).with_successor(0, node)
+                # Se conservan los nodos de la lista que siguen al nuevo sucesor
+                rest = tuple(peer for peer in self.successor_list if peer.id != node.id and in_interval(peer.id, node.id, self.id))
+                self.successor_list = ((node,) + rest)[:MAX_SUCCESSORS]
+            else:
+                self.successor_list = ()
+            self.owner_cache.invalidate()
+        logger.debug("Nodo %s ha actualizado su sucesor a %s (%s:%s)", self.id, node.id, node.ip, node.port)
+
+    def stabilize(self):
+        """
+        Pregunta al sucesor por su predecesor; si hay un nodo entre este nodo y el sucesor, ese nodo pasa a ser
+        el nuevo sucesor. Luego notifica al sucesor para que este nodo pueda ser su predecesor.
+        Las llamadas remotas se hacen sin tomar el lock; los cambios solo se aplican si el sucesor no cambió mientras tanto.
+        """
+        with self.lock:
+            if self.successor is None:
+                # Anillo de un solo nodo: el sucesor es el propio nodo, cuyo predecesor se conoce localmente
+                if self.predecessor:
+                    self.set_successor(self.predecessor)
+                else:
+                    return
+            successor = self.successor
+
+        try:
+            response = self.client.get(successor, "/get_predecessor")
+            data = response.json() if response.status_code == 200 else {}
+        except requests.exceptions.RequestException as e:
+            logger.warning("Sucesor %s no responde en nodo %s: %s", successor.id, self.id, e)
+            self.successor_failed(successor)
             return
 
-        if node_id > self.id:
-            if self.successor is None or node_id < self.successor.id:
-                previous_successor = self.successor
-                self.successor = ChordNode(node_id, node_port, node_ip)
-                print(f"[DEBUG] Nodo {self.id} ha actualizado su sucesor a {node_id} ({node_ip}:{node_port})")
+        candidate = data.get('predecessor')
+        with self.lock:
+            if self.successor is not successor:
+                return
+            if candidate and candidate['id'] != self.id and in_interval(candidate['id'], self.id, successor.id):
+                self.set_successor(candidate)
+            elif 'successors' in data:
+                # La lista de sucesores es el sucesor seguido de la lista del sucesor, hasta volver a este nodo
+                # o hasta tener replicas + 1 procesos distintos del de este nodo
+                successor_list = [NodeRef(successor.id, successor.port, successor.ip, data.get('process', successor.process))]
+                for node in data['successors']:
+                    if node['id'] == self.id or self._enough_successors(successor_list):
+                        break
+                    successor_list.append(NodeRef.from_info(node))
+                self.successor_list = tuple(successor_list)
+            successor = self.successor
+            replica_nodes = self.replica_nodes()
+            replica_ids = {node['id'] for node in replica_nodes}
+            self.replica_targets &= replica_ids
+            new_replicas = [node for node in replica_nodes if node['id'] not in self.replica_targets]
+            # Las copias hacia nodos que ya no son réplicas se abandonan
+            for key in [key for key, sync in self.replica_syncs.items() if key[0] not in replica_ids and sync.state == 'failed']:
+                del self.replica_syncs[key]
 
-                url = f"http://{node_ip}:{node_port}/update_predecessor"
-                requests.post(url, json={"predecessor_id": self.id, "predecessor_port": self.port, "predecessor_ip": self.ip})
+        for node in new_replicas:
+            # Los nodos que entran a la lista de réplicas reciben todas las claves de este nodo
+            self.start_replica_sync(node)
 
-                if previous_successor:
-                    url = f"http://{previous_successor.ip}:{previous_successor.port}/update_predecessor"
-                    requests.post(url, json={"predecessor_id": node_id, "predecessor_port": node_port, "predecessor_ip": node_ip})
+        try:
+            self.client.post(successor, "/notify", json=self.node_info())
+        except requests.exceptions.RequestException as e:
+            logger.warning("Error al notificar al sucesor %s desde nodo %s: %s", successor.id, self.id, e)
+        self.resume_handoffs()
 
-            else:
-                self.successor.join(node_info)
+    def successor_failed(self, dead):
+        """
+        Reemplaza al sucesor caído (dead) por el siguiente nodo conocido en la finger table.
+        """
+        with self.lock:
+            if self.successor is not dead:
+                return
+            self.finger_table = self.finger_table.without_node(dead.id)
+            # Primero los siguientes nodos de la lista de sucesores, luego los de la finger table
+            candidates = [peer for peer in self.successor_list if peer.id not in (dead.id, self.id)]
+            candidates += [peer for peer in self.finger_table.successors() if peer and peer.id != self.id]
+            self.successor_list = tuple(peer for peer in self.successor_list if peer.id != dead.id)
+            self.successor = None
+            if candidates:
+                self.set_successor(candidates[0])
+            elif self.predecessor and self.predecessor.id != dead.id:
+                self.set_successor(self.predecessor)
+            self.owner_cache.invalidate()
 
-        elif node_id < self.id:
-            if self.predecessor is None or node_id > self.predecessor.id:
-                previous_predecessor = self.predecessor
-                self.predecessor = ChordNode(node_id, node_port, node_ip)
-                print(f"[DEBUG] Nodo {self.id} ha actualizado su predecesor a {node_id} ({node_ip}:{node_port})")
+    def notify(self, node):
+        """
+        node cree que es el predecesor de este nodo.
+        """
+        if node['id'] == self.id:
+            return False
+        with self.lock:
+            previous = self.predecessor
+            if previous is not None and not in_interval(node['id'], previous.id, self.id):
+                return False
+            self.set_predecessor(node)
+        # Si el predecesor anterior cayó, este nodo hereda su rango y sus réplicas pasan a ser claves propias
+        self.promote_replicas()
+        # Las claves de (predecesor anterior, node] ahora son de node; sin predecesor conocido, todas las de (este nodo, node]
+        self.start_handoff(node, previous.id if previous else self.id, keep_replicas=True)
+        return True
 
-                url = f"http://{node_ip}:{node_port}/update_successor"
-                requests.post(url, json={"successor_id": self.id, "successor_port": self.port, "successor_ip": self.ip})
+    def start_handoff(self, target, start, end=None, keep_replicas=False, background=None):
+        """
+        Transfiere las claves de (start, end] (por defecto, hasta el id de target) a target, o retoma la
+        transferencia pendiente hacia target si es del mismo rango.
+        """
+        end = target['id'] if end is None else end
+        with self.lock:
+            handoff = self.handoffs.get(target['id'])
+            if handoff is None or handoff.state == 'done' or (handoff.start, handoff.end) != (start, end):
+                handoff = self.handoffs[target['id']] = KeyHandoff(self, target, start, end, keep_replicas, self.handoff_batch)
+        if self.background_handoff if background is None else background:
+            threading.Thread(target=handoff.run, name=f"handoff-{target['id']}", daemon=True).start()
+            return handoff
+        handoff.run()
+        return handoff
 
-                if previous_predecessor:
-                    url = f"http://{previous_predecessor.ip}:{previous_predecessor.port}/update_successor"
-                    requests.post(url, json={"successor_id": node_id, "successor_port": node_port, "successor_ip": node_ip})
+    def resume_handoffs(self):
+        """
+        Retoma las transferencias de join que fallaron, mientras el nodo destino siga siendo el predecesor.
+        """
+        predecessor = self.predecessor
+        for handoff in list(self.handoffs.values()):
+            if handoff.state == 'failed' and handoff.keep_replicas and predecessor is not None and handoff.target['id'] == predecessor.id:
+                self.start_handoff(handoff.target, handoff.start, handoff.end, keep_replicas=True)
 
-            else:
-                self.predecessor.join(node_info)
+    def accept_handoff(self, file_ids, replicate=True, manifests=()):
+        """
+        Recibe un lote de claves (y los manifiestos de esas claves) transferidas desde otro nodo y, si replicate
+        es True, las copia en sus réplicas (en un join no hace falta: las réplicas del nuevo nodo ya guardaban
+        esas claves como réplicas del origen). Retorna None si ya hay demasiados lotes en proceso.
+        """
+        if not self.handoff_slots.acquire(blocking=False):
+            return None
+        try:
+            self.store_manifests(manifests)
+            added = self.files.add_many(file_ids)
+            self.replica_files.remove_many(file_ids)
+            if replicate:
+                self.replicate(file_ids)
+            self.metrics.increment('handoff_keys_received', len(file_ids))
+            return added
+        finally:
+            self.handoff_slots.release()
+
+    def handoff_status(self):
+        return [handoff.status() for handoff in list(self.handoffs.values())]
+
+    def leave(self, attempts=3):
+        """
+        Sale del anillo: transfiere todas las claves al sucesor (si cae, al siguiente, retomando desde el último
+        lote confirmado) y luego enlaza al predecesor con el sucesor. Mientras dura la transferencia el nodo
+        sigue atendiendo peticiones; después solo conserva su sucesor y su finger table para reenviar búsquedas.
+        """
+        started = time.perf_counter()
+        used = {}
+        for _ in range(attempts):
+            with self.lock:
+                predecessor, successor = self.predecessor, self.successor
+            if successor is None:
+                return {'success': True, 'transferred': 0, 'message': "Nodo solo en el anillo"}
+            # (este nodo, este nodo] es todo el anillo: se transfieren todas las claves
+            handoff = used[successor.id] = self.start_handoff(successor.node_info(), self.id, self.id, background=False)
+            if handoff.state == 'done':
+                break
+            try:
+                self.client.get(successor, "/ping")
+            except requests.exceptions.RequestException:
+                self.successor_failed(successor)
+        transferred = sum(handoff.sent for handoff in used.values())
+        if handoff.state != 'done':
+            return {'success': False, 'transferred': transferred, 'error': handoff.error}
+
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.scheduler = None
+        try:
+            if predecessor is not None:
+                self.client.post(successor, "/update_predecessor", json={
+                    "predecessor_id": predecessor.id, "predecessor_port": predecessor.port, "predecessor_ip": predecessor.ip})
+                self.client.post(predecessor, "/update_successor", json={
+                    "successor_id": successor.id, "successor_port": successor.port, "successor_ip": successor.ip})
+        except requests.exceptions.RequestException as e:
+            # stabilize y check_predecessor de los vecinos terminan de enlazarlos
+            logger.warning("Error al enlazar a los vecinos del nodo %s al salir: %s", self.id, e)
+        with self.lock:
+            self.predecessor = None
+            self.successor_list = ()
+            self.replica_targets = set()
+            self.owner_cache.invalidate()
+        logger.info("Nodo %s salió del anillo: %s claves transferidas a nodo %s", self.id, transferred, successor.id)
+        return {'success': True, 'transferred': transferred, 'successor': successor.node_info(),
+                'seconds': round(time.perf_counter() - started, 3)}
 
-        if self.successor and self.successor.id != node_id:
-            url = f"http://{self.successor.ip}:{self.successor.port}/join"
-            requests.post(url, json={"node_address": node_id, "node_port": node_port, "node_ip": node_ip})
+    def set_predecessor(self, node):
+        node = NodeRef.from_info(node)
+        with self.lock:
+            self.predecessor = None if node is None or node.id == self.id else node
+            if self.predecessor is not None:
+                self.finger_table = self.finger_table.with_new_node(node)
+                logger.debug("Nodo %s ha actualizado su predecesor a %s (%s:%s)", self.id, node.id, node.ip, node.port)
+            self.owner_cache.invalidate()
 
-        if self.predecessor and self.predecessor.id != node_id:
-            url = f"http://{self.predecessor.ip}:{self.predecessor.port}/join"
-            requests.post(url, json={"node_address": node_id, "node_port": node_port, "node_ip": node_ip})
+    def fix_fingers(self):
+        """
+        Recalcula una entrada de la finger table por ronda, recorriéndolas en orden.
+        """
+        with self.lock:
+            index = self.next_finger
+            self.next_finger = (self.next_finger + 1) % self.total_bits
+        node, _ = self.find_successor(self.finger_table.start(index))
+        if node is not None:
+            current = self.finger_table.successor(index)
+            if current is None or current.id != node['id']:
+                self.update_finger_table(index, node)
+                self.owner_cache.invalidate()
+
+    def check_predecessor(self):
+        predecessor = self.predecessor
+        if predecessor is None:
+            return
+        try:
+            self.client.get(predecessor, "/ping")
+        except requests.exceptions.RequestException as e:
+            logger.warning("Predecesor %s no responde en nodo %s: %s", predecessor.id, self.id, e)
+            with self.lock:
+                # Solo se descarta si en el intertanto no llegó un predecesor nuevo por notify
+                if self.predecessor is predecessor:
+                    self.predecessor = None
+                    self.owner_cache.invalidate()
 
-        self.notify_all_nodes(node_id, node_port, node_ip)
+    def start_maintenance(self, stabilize_interval=1.0, fix_fingers_interval=0.5, check_predecessor_interval=2.0,
+                          repair_interval=30.0):
+        self.scheduler = MaintenanceScheduler(self, stabilize_interval, fix_fingers_interval, check_predecessor_interval,
+                                              repair_interval)
+        self.scheduler.start()
@@ -0,0 +1,222 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from .metrics import Histogram
+
+
+class PoolStats:
+    """
+    Contadores por nodo remoto: conexiones reutilizadas (hits), conexiones nuevas (misses),
+    peticiones fallidas y latencia de las peticiones salientes.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.peers = {}
+
+    def _peer(self, peer):
+        counts = self.peers.get(peer)
+        if counts is None:
+            counts = self.peers[peer] = {'hits': 0, 'misses': 0, 'errors': 0, 'latency': Histogram()}
+        return counts
+
+    def record_checkout(self, peer, reused):
+        with self.lock:
+            self._peer(peer)['hits' if reused else 'misses'] += 1
+
+    def record_request(self, peer, elapsed, failed):
+        with self.lock:
+            counts = self._peer(peer)
+            if failed:
+                counts['errors'] += 1
+        counts['latency'].observe(elapsed)
+
+    def quantile(self, peer, q):
+        with self.lock:
+            counts = self.peers.get(peer)
+        return counts['latency'].quantile(q) if counts else None
+
+    def snapshot(self):
+        with self.lock:
+            peers = {peer: dict(counts) for peer, counts in self.peers.items()}
+        for counts in peers.values():
+            counts['latency'] = counts['latency'].snapshot()
+        return {
+            'hits': sum(counts['hits'] for counts in peers.values()),
+            'misses': sum(counts['misses'] for counts in peers.values()),
+            'requests': sum(counts['latency']['count'] for counts in peers.values()),
+            'peers': peers
+        }
+
+
+def counting_pool(base, stats):
+    """
+    Crea una clase de pool de urllib3 que registra en stats si cada conexión sale del pool o es nueva.
+    """
+    class CountingPool(base):
+        def _get_conn(self, timeout=None):
+            conn = super()._get_conn(timeout=timeout)
+            # Una conexión sin socket abierto se tendrá que establecer de nuevo
+            reused = getattr(conn, 'sock', None) is not None
+            stats.record_checkout(f"{self.host}:{self.port}", reused)
+            return conn
+
+    return CountingPool
+
+
+class CountingAdapter(HTTPAdapter):
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': counting_pool(HTTPConnectionPool, self.stats),
+            'https': counting_pool(HTTPSConnectionPool, self.stats)
+        }
+
+
+class NodeClient:
+    """
+    Cliente HTTP compartido por todas las llamadas entre nodos. Mantiene un pool de conexiones
+    keep-alive por cada nodo remoto, con timeouts y reintentos con backoff.
+    """
+    def __init__(self, pool_size=10, max_peers=64, connect_timeout=2.0, read_timeout=10.0, retries=2, backoff=0.1,
+                 fanout_workers=8, hedge_workers=64):
+        self.timeout = (connect_timeout, read_timeout)
+        # Hilos para enviar la misma petición a varios nodos a la vez (límite de concurrencia)
+        self.fanout_workers = fanout_workers
+        self.executor = ThreadPoolExecutor(max_workers=fanout_workers, thread_name_prefix="fanout")
+        # Las lecturas escalonadas usan su propio pool: no esperan detrás de los envíos a varios nodos
+        self.hedge_executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="hedge")
+        self.stats = PoolStats()
+        # Los errores de conexión se reintentan siempre; los de lectura solo en métodos idempotentes. Los códigos
+        # 5xx no se reintentan: los envía la propia aplicación (p. ej. 502 cuando una búsqueda falla, 503 cuando
+        # el nodo está ocupado con una transferencia) y quien llama decide qué hacer con ellos
+        retry = Retry(total=retries, connect=retries, read=retries, status=0,
+                      backoff_factor=backoff, raise_on_status=False)
+        adapter = CountingAdapter(self.stats, pool_connections=max_peers, pool_maxsize=pool_size,
+                                  max_retries=retry, pool_block=False)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @staticmethod
+    def _address(node):
+        if isinstance(node, dict):
+            return f"{node['ip']}:{node['port']}"
+        return f"{node.ip}:{node.port}"
+
+    def _request(self, method, node, path, timeout, **kwargs):
+        address = self._address(node)
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.request(method, f"http://{address}{path}", timeout=timeout or self.timeout, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self.stats.record_request(address, time.perf_counter() - started, failed)
+
+    def get(self, node, path, params=None, timeout=None):
+        return self._request('GET', node, path, timeout, params=params)
+
+    def post(self, node, path, json=None, timeout=None):
+        return self._request('POST', node, path, timeout, json=json)
+
+    def put_data(self, node, path, data, params=None, timeout=None):
+        """
+        Envía bytes sin codificar (un bloque de contenido) como cuerpo de un PUT; los argumentos van en params.
+        """
+        return self._request('PUT', node, path, timeout, params=params, data=data,
+                             headers={'Content-Type': 'application/octet-stream'})
+
+    def fan_out(self, nodes, send):
+        """
+        Ejecuta send(node) para cada nodo de forma concurrente, con a lo sumo fanout_workers peticiones en curso.
+        Retorna un reporte por nodo con el resultado de la petición, en el mismo orden de nodes.
+        """
+        def run(node):
+            started = time.monotonic()
+            entry = {'id': node['id'], 'port': node['port'], 'ip': node['ip']}
+            try:
+                response = send(node)
+                entry['success'] = response.status_code == 200
+                entry['status'] = response.status_code
+                entry['response'] = response
+                if not entry['success']:
+                    entry['error'] = response.text
+            except requests.exceptions.RequestException as e:
+                entry['success'] = False
+                entry['error'] = str(e)
+            entry['elapsed'] = round(time.monotonic() - started, 4)
+            return entry
+
+        nodes = list(nodes)
+        report = [None] * len(nodes)
+        positions = iter(range(len(nodes)))
+        lock = threading.Lock()
+
+        def drain():
+            while True:
+                with lock:
+                    position = next(positions, None)
+                if position is None:
+                    return
+                report[position] = run(nodes[position])
+
+        # El hilo que llama también envía peticiones. Si todos los hilos del pool están ocupados (p. ej. esperando
+        # a un nodo virtual del mismo proceso que a su vez hace un fan_out) el envío sigue avanzando en este hilo,
+        # y las tareas que no alcanzaron a empezar se cancelan en vez de esperarlas
+        helpers = [self.executor.submit(drain) for _ in range(min(len(nodes), self.fanout_workers) - 1)]
+        drain()
+        for helper in helpers:
+            if not helper.cancel():
+                helper.result()
+        return report
+
+    def hedge(self, nodes, send, accept, budget):
+        """
+        Petición escalonada: ejecuta send(node) con el primer nodo y, si pasan budget segundos sin una respuesta
+        que cumpla accept, también con el siguiente, y así sucesivamente; un error o una respuesta no aceptada
+        adelanta el envío al siguiente nodo. Retorna el nodo y la respuesta aceptados (o None, None) y la lista
+        de (nodo, respuesta o None si falló) recibidas hasta ese momento.
+        """
+        remaining = list(nodes)
+        pending = {}
+        answers = []
+
+        def launch():
+            node = remaining.pop(0)
+            pending[self.hedge_executor.submit(send, node)] = node
+
+        launch()
+        while pending:
+            done, _ = wait(pending, timeout=budget if remaining else None, return_when=FIRST_COMPLETED)
+            if not done:
+                launch()
+                continue
+            for future in done:
+                node = pending.pop(future)
+                try:
+                    response = future.result()
+                except requests.exceptions.RequestException:
+                    response = None
+                answers.append((node, response))
+                if response is not None and accept(response):
+                    return node, response, answers
+                if remaining:
+                    launch()
+        return None, None, answers
+
+    def latency_quantile(self, node, q):
+        return self.stats.quantile(self._address(node), q)
+
+    def pool_stats(self):
+        return self.stats.snapshot()
@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Espera por defecto cuando el nodo destino responde que está ocupado (503), y cuántas veces se espera como máximo
+BUSY_WAIT = 0.05
+MAX_BUSY_WAITS = 200
+
+
+class KeyHandoff:
+    """
+    Transferencia de las claves de files de un nodo en el intervalo (start, end] a target, por lotes de
+    batch_size claves y con un solo lote en vuelo: el siguiente lote sale cuando target confirma el anterior,
+    y si target responde 503 (ocupado) se espera antes de reenviarlo. Cada lote se quita de files solo
+    después de la confirmación (mientras se envía el lote siguiente), así que un fallo no pierde claves:
+    la transferencia queda en 'failed' con el cursor en el último lote confirmado y run() la retoma desde ahí.
+    Cada lote lleva los manifiestos de sus claves, y después de las claves se copian uno a uno los bloques
+    de contenido del rango (el origen conserva sus copias), también con un cursor.
+    """
+    metric = 'handoff_keys_sent'
+
+    def __init__(self, node, target, start, end, keep_replicas=False, batch_size=10000):
+        self.node = node
+        self.target = target
+        self.start = start
+        self.end = end
+        # Si el origen sigue siendo réplica de target (join), las claves transferidas pasan a sus réplicas
+        self.keep_replicas = keep_replicas
+        self.batch_size = batch_size
+        self.keys = []
+        self.position = 0
+        self.sent = 0
+        self.digests = None
+        self.chunk_position = 0
+        self.state = 'pending'
+        self.error = None
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def _request(self, batch):
+        return "/handoff", {"file_ids": batch, "manifests": self.node.chunks.manifests_for(batch),
+                            "replicate": not self.keep_replicas}
+
+    def _chunk_path(self):
+        # En un join el origen sigue siendo réplica del rango y las réplicas de target ya tienen los bloques;
+        # en una salida target los vuelve a replicar para completar su nueva lista de réplicas
+        return "/replicate_chunk" if self.keep_replicas else "/store_chunk"
+
+    def _send_chunks(self):
+        if self.digests is None:
+            start = self.start
+            if start == self.end and self.node.predecessor is not None:
+                # Al salir solo se entregan los bloques propios; el resto son copias de bloques de los predecesores
+                start = self.node.predecessor.id
+            self.digests = self.node.chunks.digests_in_range(start, self.end, self.node.total_bits)
+        path = self._chunk_path()
+        while self.chunk_position < len(self.digests):
+            digest = self.digests[self.chunk_position]
+            data = self.node.chunks.get(digest)
+            if data is not None:
+                response = self.node.client.put_data(self.target, path, data, params={"digest": digest})
+                if response.status_code != 200:
+                    raise requests.exceptions.RequestException(f"Nodo {self.target['id']} rechazó el bloque {digest}: {response.text}")
+                self.node.metrics.increment('handoff_chunks_sent')
+            self.chunk_position += 1
+
+    def _send(self, batch):
+        path, body = self._request(batch)
+        for _ in range(MAX_BUSY_WAITS):
+            response = self.node.client.post(self.target, path, json=body)
+            if response.status_code == 503:
+                time.sleep(response.json().get('retry_after', BUSY_WAIT))
+                continue
+            if response.status_code != 200:
+                raise requests.exceptions.RequestException(f"Nodo {self.target['id']} rechazó el lote: {response.text}")
+            return
+        raise requests.exceptions.RequestException(f"Nodo {self.target['id']} sigue ocupado")
+
+    def _release(self, batch):
+        self.node.files.remove_many(batch)
+        if self.keep_replicas:
+            self.node.replica_files.add_many(batch)
+
+    def _send_pending(self):
+        # Un lote confirmado se quita de files en otro hilo mientras se envía el siguiente; al salir
+        # (también por un error) se espera a que termine de quitarse el último lote confirmado
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="handoff-release") as releaser:
+            releasing = None
+            while self.position < len(self.keys):
+                batch = self.keys[self.position:self.position + self.batch_size]
+                self._send(batch)
+                if releasing is not None:
+                    releasing.result()
+                releasing = releaser.submit(self._release, batch)
+                self.position += len(batch)
+                self.sent += len(batch)
+                self.node.metrics.increment(self.metric, len(batch))
+            if releasing is not None:
+                releasing.result()
+
+    def run(self, max_passes=3):
+        """
+        Envía las claves pendientes y vuelve a revisar el intervalo (hasta max_passes veces) por si llegaron
+        claves nuevas durante la transferencia. Retorna True si terminó y False si quedó pendiente por un fallo.
+        """
+        with self.lock:
+            self.state = 'running'
+            started = time.perf_counter()
+            try:
+                for _ in range(max_passes):
+                    if self.position >= len(self.keys):
+                        self.keys = self.node.files.range(self.start, self.end)
+                        self.position = 0
+                        if not self.keys:
+                            break
+                    self._send_pending()
+                self._send_chunks()
+                self.state = 'done'
+                self.error = None
+                return True
+            except requests.exceptions.RequestException as e:
+                logger.warning("Transferencia de claves de nodo %s a nodo %s interrumpida tras %s claves: %s",
+                               self.node.id, self.target['id'], self.sent, e)
+                self.state = 'failed'
+                self.error = str(e)
+                return False
+            finally:
+                self.elapsed += time.perf_counter() - started
+
+    def status(self):
+        return {
+            'target': self.target,
+            'range': [self.start, self.end],
+            'state': self.state,
+            'sent': self.sent,
+            'remaining': len(self.keys) - self.position,
+            'chunks_remaining': len(self.digests or ()) - self.chunk_position,
+            'seconds': round(self.elapsed, 3),
+            'error': self.error
+        }
+
+
+class ReplicaSync(KeyHandoff):
+    """
+    Copia de las claves de un nodo en (start, end] a una de sus réplicas: por lotes y retomable como KeyHandoff,
+    pero las claves se quedan en el origen y se recorre el rango una sola vez (las claves que llegan durante
+    la copia ya se replican una a una). Los lotes llevan los manifiestos de sus claves; los bloques no se copian
+    (se replican al subirlos).
+    """
+    metric = 'replica_keys_sent'
+
+    def __init__(self, node, target, start, end, batch_size=10000):
+        super().__init__(node, target, start, end, batch_size=batch_size)
+
+    def _request(self, batch):
+        return "/replicate", {"file_ids": batch, "manifests": self.node.chunks.manifests_for(batch)}
+
+    def _send_chunks(self):
+        pass
+
+    def _release(self, batch):
+        pass
+
+    def run(self, max_passes=1):
+        return super().run(max_passes)
@@ -0,0 +1,17 @@
+import hashlib
+
+
+def hash_key(value, bits):
+    """
+    Identificador de value (str, bytes o int) en un anillo de bits bits: SHA-1 reducido módulo 2^bits.
+    Se usa para los ids de los nodos (a partir de "ip:puerto") y para los nombres de archivo.
+    """
+    if isinstance(value, int):
+        value = str(value)
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return int.from_bytes(hashlib.sha1(value).digest(), 'big') % 2**bits
+
+
+def node_key(ip, port, bits):
+    return hash_key(f"{ip}:{port}", bits)
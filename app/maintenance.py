@@ -0,0 +1,43 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceScheduler:
+    """
+    Ejecuta en segundo plano las tareas periódicas de Chord (stabilize, fix_fingers, check_predecessor y la
+    reparación de réplicas), cada una en su propio hilo y con su propio intervalo en segundos.
+    """
+    def __init__(self, node, stabilize_interval=1.0, fix_fingers_interval=0.5, check_predecessor_interval=2.0,
+                 repair_interval=30.0):
+        self.node = node
+        self.tasks = [
+            ('stabilize', node.stabilize, stabilize_interval),
+            ('fix_fingers', node.fix_fingers, fix_fingers_interval),
+            ('check_predecessor', node.check_predecessor, check_predecessor_interval),
+            ('repair_replicas', node.repair_replicas, repair_interval)
+        ]
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def _run(self, name, task, interval):
+        while not self.stop_event.wait(interval):
+            try:
+                task()
+            except Exception as e:
+                # Un fallo en una ronda no debe detener el mantenimiento del anillo
+                logger.warning("Error en tarea %s del nodo %s: %s", name, self.node.id, e)
+
+    def start(self):
+        for name, task, interval in self.tasks:
+            if interval and interval > 0:
+                thread = threading.Thread(target=self._run, args=(name, task, interval), name=name, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
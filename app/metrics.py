@@ -0,0 +1,96 @@
+import threading
+from bisect import bisect_left
+
+# Límites superiores (en segundos) de los buckets de latencia
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Límites superiores de los buckets de saltos por búsqueda
+HOP_BUCKETS = tuple(range(0, 17)) + (24, 32, 64, 128, 160)
+
+
+class Histogram:
+    """
+    Histograma de buckets fijos. observe() es O(log buckets) y no guarda las muestras.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        position = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[position] += 1
+            self.count += 1
+            self.total += value
+
+    def quantile(self, q):
+        """
+        Estimación de un percentil: el límite superior del bucket donde cae (None si no hay muestras).
+        """
+        with self.lock:
+            if self.count == 0:
+                return None
+            target = q * self.count
+            seen = 0
+            for position, count in enumerate(self.counts):
+                seen += count
+                if seen >= target:
+                    return self.buckets[position] if position < len(self.buckets) else float('inf')
+        return None
+
+    def snapshot(self):
+        with self.lock:
+            counts = list(self.counts)
+            count, total = self.count, self.total
+        labels = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {
+            'count': count,
+            'sum': round(total, 6),
+            'mean': round(total / count, 6) if count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {label: n for label, n in zip(labels, counts) if n}
+        }
+
+
+class NodeMetrics:
+    """
+    Métricas de un nodo: peticiones y latencia por endpoint, y distribución de saltos por búsqueda.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.counters = {}
+        self.hops = Histogram(HOP_BUCKETS)
+
+    def observe_request(self, endpoint, status, elapsed):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = {'count': 0, 'status': {}, 'latency': Histogram()}
+            stats['count'] += 1
+            stats['status'][str(status)] = stats['status'].get(str(status), 0) + 1
+        stats['latency'].observe(elapsed)
+
+    def observe_hops(self, hops):
+        self.hops.observe(hops)
+
+    def increment(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            endpoints = dict(self.endpoints)
+            counters = dict(self.counters)
+        return {
+            'endpoints': {
+                endpoint: {'count': stats['count'], 'status': dict(stats['status']), 'latency': stats['latency'].snapshot()}
+                for endpoint, stats in endpoints.items()
+            },
+            'lookup_hops': self.hops.snapshot(),
+            'counters': counters
+        }
@@ -0,0 +1,122 @@
+from array import array
+from bisect import bisect_left
+
+
+class NodeRef:
+    """
+    Referencia inmutable a un nodo remoto: id, puerto, IP y, si se conoce, el proceso que lo aloja (los nodos
+    virtuales de un proceso lo comparten). Tiene la interfaz que usan los transportes (ip, port) y node_info(),
+    igual que ChordNode. El proceso no cuenta al comparar referencias.
+    """
+    __slots__ = ('id', 'port', 'ip', 'process')
+
+    def __init__(self, id, port, ip, process=None):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'port', port)
+        object.__setattr__(self, 'ip', ip)
+        object.__setattr__(self, 'process', process)
+
+    @classmethod
+    def from_info(cls, node):
+        if node is None or isinstance(node, cls):
+            return node
+        return cls(node['id'], node['port'], node['ip'], node.get('process'))
+
+    def node_info(self):
+        info = {'id': self.id, 'port': self.port, 'ip': self.ip}
+        if self.process is not None:
+            info['process'] = self.process
+        return info
+
+    def __setattr__(self, name, value):
+        raise AttributeError("NodeRef es inmutable")
+
+    def __eq__(self, other):
+        return isinstance(other, NodeRef) and (self.id, self.port, self.ip) == (other.id, other.port, other.ip)
+
+    def __hash__(self):
+        return hash((self.id, self.port, self.ip))
+
+    def __repr__(self):
+        return f"NodeRef({self.id}, {self.ip}:{self.port})"
+
+
+class FingerTable:
+    """
+    Finger table inmutable en arreglos paralelos: start, id del sucesor e índice del sucesor en peers
+    (-1 si la entrada está vacía). Cada nodo distinto se guarda una sola vez en peers, ordenados por
+    distancia desde el nodo dueño para buscar con bisect. Los cambios retornan una tabla nueva, así
+    que una tabla leída nunca cambia mientras se recorre.
+    """
+    __slots__ = ('node_id', 'bits', 'ring_size', 'starts', 'successor_ids', 'peer_index', 'peers', '_distances')
+
+    def __init__(self, node_id, bits, starts=None, successors=None):
+        self.node_id = node_id
+        self.bits = bits
+        self.ring_size = 2**bits
+        self.starts = starts if starts is not None else tuple((node_id + 2**i) % self.ring_size for i in range(bits))
+
+        successors = successors if successors is not None else [None] * bits
+        distance = lambda peer: (peer.id - node_id) % self.ring_size
+        self.peers = tuple(sorted({peer for peer in successors if peer is not None}, key=distance))
+        position = {peer: i for i, peer in enumerate(self.peers)}
+        self.successor_ids = tuple(peer.id if peer is not None else None for peer in successors)
+        self.peer_index = array('i', (position[peer] if peer is not None else -1 for peer in successors))
+        self._distances = [distance(peer) for peer in self.peers]
+
+    def __len__(self):
+        return self.bits
+
+    def start(self, index):
+        return self.starts[index]
+
+    def interval(self, index):
+        return self.starts[index], (self.starts[index] + 2**index) % self.ring_size
+
+    def successor(self, index):
+        position = self.peer_index[index]
+        return self.peers[position] if position >= 0 else None
+
+    def successors(self):
+        return [self.successor(index) for index in range(self.bits)]
+
+    def _replace(self, successors):
+        return FingerTable(self.node_id, self.bits, self.starts, successors)
+
+    def with_successor(self, index, peer):
+        successors = self.successors()
+        successors[index] = peer
+        return self._replace(successors)
+
+    def with_new_node(self, peer):
+        """
+        Tabla en la que peer reemplaza a cada sucesor que esté más lejos que él de la start de su entrada.
+        Retorna la misma tabla si peer no mejora ninguna entrada.
+        """
+        successors = self.successors()
+        changed = False
+        for index, current in enumerate(successors):
+            start = self.starts[index]
+            # El sucesor de la entrada es el primer nodo en [start, start + 2^m), medido en distancia circular
+            if current is None or (peer.id - start) % self.ring_size < (current.id - start) % self.ring_size:
+                successors[index] = peer
+                changed = True
+        return self._replace(successors) if changed else self
+
+    def without_node(self, node_id):
+        successors = [None if peer is not None and peer.id == node_id else peer for peer in self.successors()]
+        return self._replace(successors)
+
+    def closest_preceding(self, key, exclude=()):
+        """
+        El nodo de la tabla que más precede a key, es decir, el de mayor distancia desde el nodo dueño
+        que sigue dentro de (nodo, key), sin contar los ids de exclude. None si no hay ninguno.
+        """
+        # key == nodo dueño: el intervalo (nodo, nodo) cubre todo el anillo
+        target = (key - self.node_id) % self.ring_size or self.ring_size
+        position = bisect_left(self._distances, target) - 1
+        while position >= 0 and self.peers[position].id in exclude:
+            position -= 1
+        if position < 0 or self._distances[position] == 0:
+            return None
+        return self.peers[position]
@@ -0,0 +1,289 @@
+"""
+Operaciones entre nodos. Cada operación recibe el nodo local y los argumentos de la petición
+(query string o cuerpo JSON) y retorna (cuerpo, código de estado). La API REST y los transportes
+alternativos (app/binary_rpc.py y app/simulator.py) despachan a las mismas funciones.
+"""
+import requests
+
+from .hashing import hash_key
+from .storage import chunk_key
+
+
+class RpcResponse:
+    """
+    Respuesta de los transportes que no son HTTP, con la parte de la interfaz de requests.Response
+    que usa ChordNode (status_code, json() y text).
+    """
+    def __init__(self, body, status_code):
+        self.body = body
+        self.status_code = status_code
+
+    def json(self):
+        return self.body
+
+    @property
+    def text(self):
+        return str(self.body)
+
+    @property
+    def content(self):
+        return self.body if isinstance(self.body, bytes) else self.text.encode('utf-8')
+
+
+def _file_ids(node, args):
+    file_ids = args.get('file_ids')
+    if not isinstance(file_ids, list):
+        return None
+    ring_size = 2**node.total_bits
+    return [int(file_id) % ring_size for file_id in file_ids]
+
+
+def _manifests(args):
+    # Manifiestos que acompañan a un lote de claves (replicate y handoff)
+    manifests = args.get('manifests') or []
+    if not isinstance(manifests, list) or not all(isinstance(manifest, dict) and manifest.get('file_id') is not None for manifest in manifests):
+        raise ValueError("manifests debe ser una lista de manifiestos")
+    return manifests
+
+
+def file_key(node, args):
+    """
+    Clave de la petición: file_id reducido al anillo del nodo (módulo 2^bits) o, si se envía file_name,
+    su hash SHA-1 en el anillo.
+    """
+    file_id = args.get('file_id')
+    if file_id is not None:
+        return int(file_id) % 2**node.total_bits
+    file_name = args.get('file_name')
+    if file_name is not None:
+        return hash_key(file_name, node.total_bits)
+    return None
+
+
+def _node(args, prefix=''):
+    node_id = args.get(f'{prefix}id')
+    node_port = args.get(f'{prefix}port')
+    node_ip = args.get(f'{prefix}ip')
+    if node_id is None or node_port is None or node_ip is None:
+        return None
+    return {'id': int(node_id), 'port': int(node_port), 'ip': node_ip}
+
+
+def upload(node, args):
+    file_id = file_key(node, args)
+    if file_id is None:
+        return {"error": "File ID or file name is required"}, 400
+    name = args.get('file_name', file_id)
+    try:
+        target_node, hops = node.store_file_via_finger_table(file_id)
+    except requests.exceptions.RequestException as e:
+        return {"error": f"No se pudo almacenar el archivo '{name}': {e}"}, 502
+    if target_node is None:
+        return {"error": f"No se pudo encontrar el nodo responsable del archivo '{name}'"}, 502
+    return {"success": True, "file_id": file_id, "node": target_node, "hops": hops, "message": f"Archivo '{name}' almacenado usando la finger table."}, 200
+
+
+def find_successor(node, args):
+    file_id = args.get('file_id')
+    if file_id is None:
+        return {"error": "File ID is required"}, 400
+    target_node, hops = node.find_successor(int(file_id))
+    if target_node is None:
+        return {"error": "No se pudo completar la búsqueda", "hops": hops}, 502
+    return {"node": target_node, "hops": hops}, 200
+
+
+def find_successor_step(node, args):
+    file_id = args.get('file_id')
+    if file_id is None:
+        return {"error": "File ID is required"}, 400
+    # exclude: ids separados por coma de nodos que no respondieron en esta búsqueda
+    exclude = {int(node_id) for node_id in str(args.get('exclude') or '').split(',') if node_id}
+    return node.find_successor_step(int(file_id), exclude), 200
+
+
+def store_batch(node, args):
+    file_ids = _file_ids(node, args)
+    if file_ids is None:
+        return {"error": "A list of file IDs is required"}, 400
+    return {"success": True, "stored": node.store_local_files(file_ids)}, 200
+
+
+def check_batch(node, args):
+    file_ids = _file_ids(node, args)
+    if file_ids is None:
+        return {"error": "A list of file IDs is required"}, 400
+    return {"exists": node.check_local_files(file_ids), "not_responsible": node.foreign_files(file_ids)}, 200
+
+
+def check_file(node, args):
+    file_id = args.get('file_id')
+    if file_id is None:
+        return {"error": "File ID is required"}, 400
+    file_id = int(file_id) % 2**node.total_bits
+    replica = file_id in node.replica_files
+    return {"exists": replica or file_id in node.files, "replica": replica, "responsible": node.is_responsible(file_id)}, 200
+
+
+def replicate(node, args):
+    file_ids = _file_ids(node, args)
+    if file_ids is None:
+        return {"error": "A list of file IDs is required"}, 400
+    return {"success": True, "stored": node.store_replicas(file_ids, _manifests(args))}, 200
+
+
+def replica_digest(node, args):
+    buckets = args.get('buckets')
+    if not isinstance(buckets, list):
+        return {"error": "A list of key ranges is required"}, 400
+    return {"digests": node.replica_digests([(int(start), int(end)) for start, end in buckets])}, 200
+
+
+def _chunk(args):
+    digest = args.get('digest')
+    data = args.get('data')
+    if digest is None or not isinstance(data, (bytes, bytearray)):
+        return None, None
+    return digest, data
+
+
+def store_chunk(node, args):
+    digest, data = _chunk(args)
+    if digest is None:
+        return {"error": "Chunk digest and data are required"}, 400
+    added = node.store_chunk(digest, data)
+    return {"success": True, "added": added, "responsible": node.is_responsible(chunk_key(digest, node.total_bits))}, 200
+
+
+def replicate_chunk(node, args):
+    digest, data = _chunk(args)
+    if digest is None:
+        return {"error": "Chunk digest and data are required"}, 400
+    return {"success": True, "added": node.store_chunk(digest, data, replicate=False)}, 200
+
+
+def chunk(node, args):
+    digest = args.get('digest')
+    if digest is None:
+        return {"error": "Chunk digest is required"}, 400
+    data = node.chunks.get(digest)
+    if data is None:
+        return {"error": f"Bloque {digest} no encontrado"}, 404
+    # El cuerpo son los bytes del bloque: la API REST los envía tal cual y no como JSON
+    return data, 200
+
+
+def store_manifest(node, args):
+    manifest = args.get('manifest')
+    if not isinstance(manifest, dict) or manifest.get('file_id') is None or not isinstance(manifest.get('chunks'), list):
+        return {"error": "A file manifest is required"}, 400
+    node.store_manifest(manifest, replicate=not args.get('replica'))
+    return {"success": True, "responsible": node.is_responsible(int(manifest['file_id']))}, 200
+
+
+def manifest(node, args):
+    file_id = file_key(node, args)
+    if file_id is None:
+        return {"error": "File ID or file name is required"}, 400
+    result = node.chunks.get_manifest(file_id)
+    if result is None:
+        return {"error": f"Archivo {file_id} no encontrado"}, 404
+    return result, 200
+
+
+def handoff(node, args):
+    file_ids = _file_ids(node, args)
+    if file_ids is None:
+        return {"error": "A list of file IDs is required"}, 400
+    added = node.accept_handoff(file_ids, replicate=args.get('replicate', True), manifests=_manifests(args))
+    if added is None:
+        return {"error": "Nodo ocupado recibiendo otras transferencias", "retry_after": 0.05}, 503
+    return {"success": True, "stored": added}, 200
+
+
+def get_predecessor(node, args):
+    predecessor, successor = node.neighbours()
+    successors = [peer.node_info() for peer in node.successor_list]
+    return {"predecessor": predecessor, "successor": successor, "successors": successors, "process": node.process}, 200
+
+
+def notify(node, args):
+    candidate = _node(args)
+    if candidate is None:
+        return {"error": "Node ID, port, and IP are required"}, 400
+    return {"success": True, "updated": node.notify(candidate)}, 200
+
+
+def ping(node, args):
+    return {"id": node.id}, 200
+
+
+def node_state(node, args):
+    return node.node_state(), 200
+
+
+def node_load(node, args):
+    return node.node_load(), 200
+
+
+def update_predecessor(node, args):
+    predecessor = _node(args, 'predecessor_')
+    if predecessor is None:
+        return {"error": "Predecessor ID, port, and IP are required"}, 400
+    node.set_predecessor(predecessor)
+    # El nodo puede heredar un rango (p. ej. tras un leave): las réplicas de ese rango pasan a ser claves propias
+    node.promote_replicas()
+    return {"success": True}, 200
+
+
+def update_successor(node, args):
+    successor = _node(args, 'successor_')
+    if successor is None:
+        return {"error": "Successor ID, port, and IP are required"}, 400
+    node.set_successor(successor)
+    return {"success": True}, 200
+
+
+def update_finger_table(node, args):
+    new_node = _node(args, 'new_node_')
+    if new_node is None:
+        return {"error": "New node ID, port, and IP are required"}, 400
+    node.update_fingers_with_new_node(new_node['id'], new_node['port'], new_node['ip'])
+    node.owner_cache.invalidate()
+    return {"success": True}, 200
+
+
+ROUTES = {
+    '/upload': upload,
+    '/find_successor': find_successor,
+    '/find_successor_step': find_successor_step,
+    '/store_batch': store_batch,
+    '/check_batch': check_batch,
+    '/check_file': check_file,
+    '/replicate': replicate,
+    '/replica_digest': replica_digest,
+    '/handoff': handoff,
+    '/store_chunk': store_chunk,
+    '/replicate_chunk': replicate_chunk,
+    '/chunk': chunk,
+    '/store_manifest': store_manifest,
+    '/manifest': manifest,
+    '/get_predecessor': get_predecessor,
+    '/notify': notify,
+    '/ping': ping,
+    '/node_state': node_state,
+    '/node_load': node_load,
+    '/update_predecessor': update_predecessor,
+    '/update_successor': update_successor,
+    '/update_finger_table': update_finger_table
+}
+
+
+def dispatch(node, path, args):
+    handler = ROUTES.get(path)
+    if handler is None:
+        return {"error": f"Unknown operation {path}"}, 404
+    try:
+        return handler(node, args or {})
+    except (TypeError, ValueError) as e:
+        return {"error": str(e)}, 400
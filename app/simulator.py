@@ -0,0 +1,218 @@
+import random
+import time
+from bisect import bisect_left
+
+import requests
+
+from . import rpc
+from .chord import ChordNode
+from .routing import FingerTable
+
+
+class InMemoryTransport:
+    """
+    Transporte con la interfaz de NodeClient que entrega las peticiones directamente a otros ChordNode
+    del mismo proceso (despachando con app/rpc.py), sin HTTP. Cuenta los mensajes enviados por operación.
+    """
+    def __init__(self, network):
+        self.network = network
+        self.messages = 0
+        self.messages_by_path = {}
+
+    @staticmethod
+    def _address(node):
+        if isinstance(node, dict):
+            return (node['ip'], node['port'])
+        return (node.ip, node.port)
+
+    def _request(self, node, path, args):
+        self.messages += 1
+        self.messages_by_path[path] = self.messages_by_path.get(path, 0) + 1
+        target = self.network.get(self._address(node))
+        if target is None:
+            raise requests.exceptions.ConnectionError(f"Nodo {self._address(node)} no existe en la red simulada")
+        body, status = rpc.dispatch(target, path, args)
+        return rpc.RpcResponse(body, status)
+
+    def get(self, node, path, params=None, timeout=None):
+        return self._request(node, path, params)
+
+    def post(self, node, path, json=None, timeout=None):
+        return self._request(node, path, json)
+
+    def put_data(self, node, path, data, params=None, timeout=None):
+        return self._request(node, path, dict(params or {}, data=data))
+
+    def fan_out(self, nodes, send):
+        report = []
+        for node in nodes:
+            entry = {'id': node['id'], 'port': node['port'], 'ip': node['ip']}
+            try:
+                response = send(node)
+                entry['success'] = response.status_code == 200
+                entry['status'] = response.status_code
+                entry['response'] = response
+                if not entry['success']:
+                    entry['error'] = response.text
+            except requests.exceptions.RequestException as e:
+                entry['success'] = False
+                entry['error'] = str(e)
+            report.append(entry)
+        return report
+
+    def hedge(self, nodes, send, accept, budget):
+        # Sin latencias reales las réplicas se consultan una tras otra
+        answers = []
+        for node in nodes:
+            try:
+                response = send(node)
+            except requests.exceptions.RequestException:
+                response = None
+            answers.append((node, response))
+            if response is not None and accept(response):
+                return node, response, answers
+        return None, None, answers
+
+    def latency_quantile(self, node, q):
+        return None
+
+    def pool_stats(self):
+        return {'hits': 0, 'misses': 0, 'requests': self.messages, 'peers': {}}
+
+    def reset_counters(self):
+        self.messages = 0
+        self.messages_by_path = {}
+
+
+class SimulatedRing:
+    """
+    Anillo de ChordNode en un solo proceso, conectados con un InMemoryTransport compartido.
+    Las tareas de mantenimiento se ejecutan por rondas explícitas en vez de hilos.
+    """
+    def __init__(self, bits=32, seed=0, repair_every=10, **node_options):
+        self.bits = bits
+        self.ring_size = 2**bits
+        self.random = random.Random(seed)
+        self.node_options = node_options
+        self.network = {}
+        self.transport = InMemoryTransport(self.network)
+        self.nodes = []
+        self.rounds = 0
+        # Rondas entre cada reparación de réplicas (0 la desactiva)
+        self.repair_every = repair_every
+
+    def _new_id(self):
+        used = {node.id for node in self.nodes}
+        while True:
+            node_id = self.random.randrange(self.ring_size)
+            if node_id not in used:
+                return node_id
+
+    def create_node(self, node_id=None):
+        node_id = self._new_id() if node_id is None else node_id
+        # Sin hilos: las transferencias de claves se ejecutan dentro de la ronda que las provoca
+        options = dict({'background_handoff': False}, **self.node_options)
+        node = ChordNode(node_id, len(self.network), 'sim', bits=self.bits, client=self.transport, **options)
+        self.network[(node.ip, node.port)] = node
+        self.nodes.append(node)
+        return node
+
+    def sorted_ids(self):
+        return sorted(node.id for node in self.nodes)
+
+    def owner_of(self, key, sorted_ids=None):
+        sorted_ids = sorted_ids or self.sorted_ids()
+        return sorted_ids[bisect_left(sorted_ids, key % self.ring_size) % len(sorted_ids)]
+
+    def build_static(self, count):
+        """
+        Crea count nodos con sucesores, predecesores y finger tables ya correctos, sin enviar mensajes.
+        """
+        for _ in range(count):
+            self.create_node()
+        by_id = {node.id: node for node in self.nodes}
+        sorted_ids = self.sorted_ids()
+        for position, node_id in enumerate(sorted_ids):
+            node = by_id[node_id]
+            node.set_successor(by_id[sorted_ids[(position + 1) % len(sorted_ids)]].node_info())
+            node.set_predecessor(by_id[sorted_ids[position - 1]].node_info())
+            node.successor_list = tuple(by_id[sorted_ids[(position + i) % len(sorted_ids)]].ref
+                                        for i in range(1, min(node.replicas + 1, len(sorted_ids) - 1) + 1))
+            node.replica_targets = {peer['id'] for peer in node.replica_nodes()}
+            node.finger_table = FingerTable(node.id, self.bits, node.finger_table.starts,
+                                            [by_id[self.owner_of(start, sorted_ids)].ref for start in node.finger_table.starts])
+        return self.nodes
+
+    def join(self, via=None):
+        """
+        Une un nodo nuevo a través de via (un nodo existente al azar por defecto).
+        Retorna el nodo y la cantidad de mensajes que costó la operación join.
+        """
+        via = via or self.random.choice(self.nodes)
+        node = self.create_node()
+        before = self.transport.messages
+        node.join((via.id, via.port, via.ip))
+        return node, self.transport.messages - before
+
+    def leave(self, node):
+        """
+        Saca node del anillo con una salida ordenada. Retorna el resultado de leave y los mensajes usados.
+        """
+        before = self.transport.messages
+        result = node.leave()
+        if result['success']:
+            self.nodes.remove(node)
+            del self.network[(node.ip, node.port)]
+        return result, self.transport.messages - before
+
+    def maintenance_round(self, fix_fingers=1):
+        """
+        Cada nodo ejecuta stabilize, check_predecessor y fix_fingers (fix_fingers veces), y cada repair_every
+        rondas también repair_replicas. Retorna los mensajes usados.
+        """
+        before = self.transport.messages
+        self.rounds += 1
+        repair = self.repair_every and self.rounds % self.repair_every == 0
+        for node in list(self.nodes):
+            node.stabilize()
+            node.check_predecessor()
+            for _ in range(fix_fingers):
+                node.fix_fingers()
+            if repair:
+                node.repair_replicas()
+        return self.transport.messages - before
+
+    def ring_is_consistent(self):
+        by_id = {node.id: node for node in self.nodes}
+        sorted_ids = self.sorted_ids()
+        for position, node_id in enumerate(sorted_ids):
+            node = by_id[node_id]
+            successor_id = node.successor.id if node.successor else node.id
+            predecessor_id = node.predecessor.id if node.predecessor else None
+            if successor_id != sorted_ids[(position + 1) % len(sorted_ids)]:
+                return False
+            if len(sorted_ids) > 1 and predecessor_id != sorted_ids[position - 1]:
+                return False
+        return True
+
+    def fingers_are_correct(self):
+        sorted_ids = self.sorted_ids()
+        for node in self.nodes:
+            finger_table = node.finger_table
+            for index in range(len(finger_table)):
+                if finger_table.successor_ids[index] != self.owner_of(finger_table.start(index), sorted_ids):
+                    return False
+        return True
+
+    def converge(self, max_rounds=1000, fingers=True, fix_fingers=1):
+        """
+        Ejecuta rondas de mantenimiento hasta que el anillo (y opcionalmente las finger tables) sea correcto.
+        Retorna las rondas, los mensajes y el tiempo usados, o rounds=None si no convergió.
+        """
+        started = time.perf_counter()
+        messages = 0
+        for rounds in range(max_rounds + 1):
+            if self.ring_is_consistent() and (not fingers or self.fingers_are_correct()):
+                return {'rounds': rounds, 'messages': messages, 'seconds': time.perf_counter() - started}
+            messages += self.maintenance_round(fix_fingers)
+        return {'rounds': None, 'messages': messages, 'seconds': time.perf_counter() - started}
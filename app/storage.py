@@ -0,0 +1,559 @@
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import re
+import threading
+from bisect import bisect_right
+from itertools import islice
+
+# Las claves se guardan como enteros big-endian de ancho fijo (hasta 160 bits, el tamaño de SHA-1)
+KEY_BYTES = 20
+OP_ADD = b'+'
+OP_REMOVE = b'-'
+RECORD_BYTES = 1 + KEY_BYTES
+# Claves por bloque al recorrer o reescribir el índice
+INDEX_BLOCK = 4096
+
+
+def encode_key(key):
+    if not 0 <= key < 2**(8 * KEY_BYTES):
+        raise ValueError(f"La clave {key} no cabe en {KEY_BYTES} bytes")
+    return key.to_bytes(KEY_BYTES, 'big')
+
+
+def ring_range(sorted_keys, start, end):
+    """
+    Retorna las claves de la lista ordenada que pertenecen al intervalo circular (start, end].
+    """
+    if start < end:
+        return sorted_keys[bisect_right(sorted_keys, start):bisect_right(sorted_keys, end)]
+    return sorted_keys[bisect_right(sorted_keys, start):] + sorted_keys[:bisect_right(sorted_keys, end)]
+
+
+def in_ring_range(key, start, end):
+    """
+    Indica si key pertenece al intervalo circular (start, end] (start == end es todo el anillo).
+    """
+    if start < end:
+        return start < key <= end
+    return key > start or key <= end
+
+
+def ring_buckets(start, end, count, ring_size):
+    """
+    Divide el intervalo circular (start, end] en a lo sumo count tramos consecutivos no vacíos (start == end es
+    todo el anillo). Retorna la lista de pares (inicio, fin) de cada tramo.
+    """
+    length = (end - start) % ring_size or ring_size
+    count = max(1, min(count, length))
+    bounds = [(start + length * index // count) % ring_size for index in range(count + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+def keys_digest(keys):
+    """
+    Resumen de una lista de claves: cantidad y SHA-1 de las claves en orden. Dos nodos con el mismo resumen
+    de un tramo guardan las mismas claves en ese tramo.
+    """
+    digest = hashlib.sha1()
+    for start in range(0, len(keys), INDEX_BLOCK):
+        digest.update(b''.join(encode_key(key) for key in keys[start:start + INDEX_BLOCK]))
+    return [len(keys), digest.hexdigest()]
+
+
+class MemoryKeyStore:
+    """
+    Conjunto de claves en memoria: pertenencia O(1), sin duplicados e iteración ordenada.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = set()
+        self._sorted = None
+
+    def add(self, key):
+        return self.add_many([key]) == 1
+
+    def add_many(self, keys):
+        with self.lock:
+            before = len(self.keys)
+            self.keys.update(keys)
+            added = len(self.keys) - before
+            if added:
+                self._sorted = None
+            return added
+
+    def remove(self, key):
+        return self.remove_many([key]) == 1
+
+    def remove_many(self, keys):
+        with self.lock:
+            before = len(self.keys)
+            self.keys.difference_update(keys)
+            removed = before - len(self.keys)
+            if removed:
+                self._sorted = None
+            return removed
+
+    def sorted_keys(self):
+        with self.lock:
+            if self._sorted is None:
+                self._sorted = sorted(self.keys)
+            return self._sorted
+
+    def range(self, start, end):
+        return ring_range(self.sorted_keys(), start, end)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.sorted_keys())
+
+    def __repr__(self):
+        return repr(self.sorted_keys())
+
+
+def parse_records(data):
+    """
+    Registros (operación, clave) de un log. Un registro incompleto al final (caída a mitad de escritura) se
+    descarta; retorna también los bytes usados.
+    """
+    usable = len(data) - len(data) % RECORD_BYTES
+    records = [(data[offset:offset + 1], int.from_bytes(data[offset + 1:offset + RECORD_BYTES], 'big'))
+               for offset in range(0, usable, RECORD_BYTES)]
+    return records, usable
+
+
+class _IndexView:
+    """
+    Estado de un LogKeyStore: el índice compactado (mmap de solo lectura) y los cambios del log que aún no
+    están en él. compact() arma una vista nueva y la reemplaza de una vez, así que quien toma self.view ve
+    un índice y unos cambios que corresponden entre sí aunque haya una compactación en curso.
+    """
+    def __init__(self, path):
+        self.index = None
+        self.count = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as index_file:
+                self.index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.count = len(self.index) // KEY_BYTES
+        self.added = set()
+        self.removed = set()
+        self.sorted_added = None
+
+    def key(self, position):
+        offset = position * KEY_BYTES
+        return int.from_bytes(self.index[offset:offset + KEY_BYTES], 'big')
+
+    def bisect(self, key, right=False):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            value = self.key(middle)
+            if value < key or (right and value == key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def indexed(self, key):
+        position = self.bisect(key)
+        return position < self.count and self.key(position) == key
+
+    def members(self, sorted_keys):
+        """
+        Claves de sorted_keys que están en el índice. Si caen en un tramo corto del índice (como las claves
+        de un rango transferido entre nodos) ese tramo se lee una sola vez en vez de buscar cada clave.
+        """
+        if self.index is None or not sorted_keys:
+            return set()
+        low = self.bisect(sorted_keys[0])
+        high = self.bisect(sorted_keys[-1], right=True)
+        if high - low > 4 * len(sorted_keys):
+            return {key for key in sorted_keys if self.indexed(key)}
+        data = self.index[low * KEY_BYTES:high * KEY_BYTES]
+        span = {int.from_bytes(data[offset:offset + KEY_BYTES], 'big') for offset in range(0, len(data), KEY_BYTES)}
+        return span.intersection(sorted_keys)
+
+    def apply(self, op, key, indexed):
+        """
+        Aplica un registro del log como una operación de conjunto (indexed: la clave está en el índice): agregar
+        una clave vigente o quitar una que no está no cambia nada. Así el log se puede releer sobre un índice
+        que ya lo incluye (caída de compact() después de reemplazar el índice y antes de vaciar el log).
+        """
+        if op == OP_ADD:
+            if key in self.removed:
+                self.removed.discard(key)
+            elif not indexed:
+                self.added.add(key)
+        else:
+            if key in self.added:
+                self.added.discard(key)
+            elif indexed:
+                self.removed.add(key)
+        self.sorted_added = None
+
+    def apply_records(self, records):
+        indexed = self.members(sorted({key for _, key in records}))
+        for op, key in records:
+            self.apply(op, key, key in indexed)
+
+    def iter_index(self, start_position=0, end_position=None, removed=None):
+        end_position = self.count if end_position is None else end_position
+        removed = self.removed if removed is None else removed
+        # Se lee el mmap por bloques de INDEX_BLOCK claves en vez de una clave a la vez
+        for block_start in range(start_position, end_position, INDEX_BLOCK):
+            data = self.index[block_start * KEY_BYTES:min(block_start + INDEX_BLOCK, end_position) * KEY_BYTES]
+            for offset in range(0, len(data), KEY_BYTES):
+                key = int.from_bytes(data[offset:offset + KEY_BYTES], 'big')
+                if key not in removed:
+                    yield key
+
+    def added_sorted(self):
+        if self.sorted_added is None:
+            self.sorted_added = sorted(self.added)
+        return self.sorted_added
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+            self.count = 0
+
+
+class LogKeyStore:
+    """
+    Conjunto de claves persistente. Las escrituras se agregan a un log (keys.log) y las claves
+    compactadas viven en un índice ordenado de ancho fijo (keys.idx) que se consulta con mmap y
+    búsqueda binaria, así que al reiniciar el nodo solo se relee el log pendiente de compactar.
+    Las consultas de pertenencia no toman el lock y no esperan a una compactación.
+    """
+    def __init__(self, directory, compact_threshold=100000):
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, 'keys.idx')
+        self.log_path = os.path.join(directory, 'keys.log')
+        self.compact_threshold = compact_threshold
+        # lock protege las escrituras y el reemplazo de view; compact_lock permite una compactación a la vez
+        self.lock = threading.RLock()
+        self.compact_lock = threading.Lock()
+        self.view = _IndexView(self.index_path)
+        self.log_records = 0
+        self._replay_log()
+        self.log = open(self.log_path, 'ab')
+
+    def _replay_log(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb') as log_file:
+            data = log_file.read()
+        records, usable = parse_records(data)
+        self.view.apply_records(records)
+        self.log_records = len(records)
+        if usable != len(data):
+            with open(self.log_path, 'r+b') as log_file:
+                log_file.truncate(usable)
+
+    def _write(self, op, keys):
+        keys = sorted(set(keys))
+        if keys:
+            # Basta validar los extremos: encode_key revisa que la clave quepa en KEY_BYTES
+            encode_key(keys[0])
+            encode_key(keys[-1])
+        with self.lock:
+            view = self.view
+            # Claves vigentes del lote: agregadas en el log o en el índice sin haber sido quitadas
+            indexed = view.members(keys) - view.removed
+            if op == OP_ADD:
+                changed = [key for key in keys if key not in view.added and key not in indexed]
+                # Una clave quitada del índice vuelve a estar vigente al quitarla de removed; las demás van a added
+                revived = view.removed.intersection(changed)
+                view.removed -= revived
+                view.added.update(key for key in changed if key not in revived)
+            else:
+                changed = [key for key in keys if key in view.added or key in indexed]
+                view.added.difference_update(changed)
+                view.removed.update(key for key in changed if key in indexed)
+            if changed:
+                view.sorted_added = None
+                self.log.write(b''.join(op + key.to_bytes(KEY_BYTES, 'big') for key in changed))
+                self.log.flush()
+                self.log_records += len(changed)
+        # Reescribir el índice cuesta lo mismo que su tamaño: se espera a que el log crezca en proporción.
+        # Si ya hay una compactación en curso, esta escritura no la espera
+        if changed and self.log_records >= max(self.compact_threshold, self.view.count // 2) \
+                and self.compact_lock.acquire(blocking=False):
+            try:
+                self._compact()
+            finally:
+                self.compact_lock.release()
+        return len(changed)
+
+    def add(self, key):
+        return self.add_many([key]) == 1
+
+    def add_many(self, keys):
+        return self._write(OP_ADD, keys)
+
+    def remove(self, key):
+        return self.remove_many([key]) == 1
+
+    def remove_many(self, keys):
+        return self._write(OP_REMOVE, keys)
+
+    def compact(self):
+        """
+        Reescribe el índice ordenado con todas las claves vigentes y vacía el log.
+        """
+        with self.compact_lock:
+            self._compact()
+
+    def _compact(self):
+        # El índice nuevo se escribe sin el lock, desde una copia de los cambios: mientras tanto las lecturas y
+        # escrituras siguen sobre la vista actual. Con el lock solo se reemplazan el índice, la vista y el log
+        with self.lock:
+            view = self.view
+            removed = frozenset(view.removed)
+            added = view.added_sorted()
+            compacted_records = self.log_records
+        temporary_path = self.index_path + '.tmp'
+        with open(temporary_path, 'wb') as index_file:
+            keys = heapq.merge(view.iter_index(removed=removed), added)
+            while True:
+                # Las claves ya se validaron al escribirlas en el log: se escriben por bloques sin volver a revisarlas
+                block = b''.join(key.to_bytes(KEY_BYTES, 'big') for key in islice(keys, INDEX_BLOCK))
+                if not block:
+                    break
+                index_file.write(block)
+            index_file.flush()
+            os.fsync(index_file.fileno())
+
+        with self.lock:
+            # Si el proceso cae entre los dos reemplazos, el log completo se relee sobre el índice nuevo sin efectos
+            os.replace(temporary_path, self.index_path)
+            compacted = _IndexView(self.index_path)
+            # Los registros escritos durante la compactación se conservan en el log y se aplican sobre el índice nuevo
+            with open(self.log_path, 'rb') as log_file:
+                log_file.seek(compacted_records * RECORD_BYTES)
+                tail = log_file.read()
+            records, _ = parse_records(tail)
+            compacted.apply_records(records)
+            temporary_log = self.log_path + '.tmp'
+            with open(temporary_log, 'wb') as log_file:
+                log_file.write(tail)
+            self.log.close()
+            os.replace(temporary_log, self.log_path)
+            self.log = open(self.log_path, 'ab')
+            self.log_records = len(records)
+            # La vista anterior no se cierra: un lector puede estar usándola, y su mmap se libera con ella
+            self.view = compacted
+
+    def _range_linear(self, view, start, end):
+        # Claves en (start, end] sin considerar el cruce por cero
+        index_keys = view.iter_index(view.bisect(start, right=True), view.bisect(end, right=True))
+        added = view.added_sorted()
+        added_keys = added[bisect_right(added, start):bisect_right(added, end)]
+        return heapq.merge(index_keys, added_keys)
+
+    def range(self, start, end):
+        with self.lock:
+            view = self.view
+            if start < end:
+                return list(self._range_linear(view, start, end))
+            keys = list(self._range_linear(view, start, 2**(8 * KEY_BYTES) - 1))
+            if end >= 0:
+                keys.extend(self._range_linear(view, -1, end))
+            return keys
+
+    def __contains__(self, key):
+        view = self.view
+        if key in view.added:
+            return True
+        if key in view.removed:
+            return False
+        return view.indexed(key)
+
+    def __len__(self):
+        view = self.view
+        return view.count - len(view.removed) + len(view.added)
+
+    def __iter__(self):
+        with self.lock:
+            view = self.view
+            return iter(list(heapq.merge(view.iter_index(), view.added_sorted())))
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def close(self):
+        with self.compact_lock, self.lock:
+            self.log.close()
+            self.view.close()
+
+
+# Tamaño por defecto de los bloques en que se divide el contenido de un archivo
+CHUNK_SIZE = 1024 * 1024
+DIGEST = re.compile(r'[0-9a-f]{40}')
+
+
+def chunk_digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def chunk_key(digest, bits):
+    """
+    Posición de un bloque en el anillo: su digest SHA-1 módulo 2^bits (igual que hash_key de su contenido).
+    """
+    return int(digest, 16) % 2**bits
+
+
+def read_chunks(stream, chunk_size=CHUNK_SIZE):
+    """
+    Lee stream en bloques de chunk_size bytes (el último puede ser menor) sin cargarlo completo en memoria.
+    """
+    while True:
+        parts = []
+        missing = chunk_size
+        while missing:
+            part = stream.read(missing)
+            if not part:
+                break
+            parts.append(part)
+            missing -= len(part)
+        if parts:
+            yield b''.join(parts)
+        if missing:
+            return
+
+
+def _check_chunk(digest, data):
+    if not isinstance(digest, str) or not DIGEST.fullmatch(digest):
+        raise ValueError(f"Digest de bloque inválido: {digest!r}")
+    if data is not None and chunk_digest(data) != digest:
+        raise ValueError(f"El contenido no corresponde al digest {digest}")
+
+
+class MemoryChunkStore:
+    """
+    Bloques de contenido por digest SHA-1, y manifiestos (lista de bloques de cada archivo) por file_id, en memoria.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.chunks = {}
+        self.manifests = {}
+
+    def put(self, digest, data):
+        _check_chunk(digest, data)
+        with self.lock:
+            if digest in self.chunks:
+                return False
+            self.chunks[digest] = bytes(data)
+            return True
+
+    def get(self, digest):
+        _check_chunk(digest, None)
+        return self.chunks.get(digest)
+
+    def put_manifest(self, file_id, manifest):
+        with self.lock:
+            self.manifests[file_id] = manifest
+
+    def get_manifest(self, file_id):
+        return self.manifests.get(file_id)
+
+    def manifests_for(self, file_ids):
+        """
+        Manifiestos guardados de las claves file_ids (las claves sin manifiesto se omiten).
+        """
+        return [self.manifests[file_id] for file_id in file_ids if file_id in self.manifests]
+
+    def digests_in_range(self, start, end, bits):
+        """
+        Digests de los bloques guardados cuya posición en el anillo (chunk_key) está en (start, end].
+        """
+        return [digest for digest in list(self.chunks) if in_ring_range(chunk_key(digest, bits), start, end)]
+
+    def __contains__(self, digest):
+        return digest in self.chunks
+
+    def __len__(self):
+        return len(self.chunks)
+
+
+class DiskChunkStore:
+    """
+    Bloques de contenido en disco, un archivo por bloque en directory/<2 primeros caracteres>/<digest>.
+    Como el nombre es el digest del contenido, un bloque nunca se sobrescribe: se escribe en un archivo
+    temporal y se renombra, así que un lector nunca ve un bloque a medio escribir. Los manifiestos se
+    guardan como JSON en directory/manifests/<file_id>.json.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_directory = os.path.join(directory, 'manifests')
+        os.makedirs(self.manifest_directory, exist_ok=True)
+        self.lock = threading.Lock()
+        # Bloques y manifiestos ya guardados (un reinicio los conserva; los .tmp de escrituras interrumpidas no cuentan)
+        self.digests = {name for _, _, files in os.walk(directory) for name in files if DIGEST.fullmatch(name)}
+        self.manifest_ids = {int(name[:-len('.json')]) for name in os.listdir(self.manifest_directory)
+                             if re.fullmatch(r'\d+\.json', name)}
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def put(self, digest, data):
+        _check_chunk(digest, data)
+        path = self._path(digest)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'wb') as chunk_file:
+            chunk_file.write(data)
+        os.replace(temporary_path, path)
+        with self.lock:
+            self.digests.add(digest)
+        return True
+
+    def get(self, digest):
+        _check_chunk(digest, None)
+        try:
+            with open(self._path(digest), 'rb') as chunk_file:
+                return chunk_file.read()
+        except FileNotFoundError:
+            return None
+
+    def put_manifest(self, file_id, manifest):
+        path = os.path.join(self.manifest_directory, f"{int(file_id)}.json")
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temporary_path, path)
+        with self.lock:
+            self.manifest_ids.add(int(file_id))
+
+    def get_manifest(self, file_id):
+        try:
+            with open(os.path.join(self.manifest_directory, f"{int(file_id)}.json")) as manifest_file:
+                return json.load(manifest_file)
+        except FileNotFoundError:
+            return None
+
+    def manifests_for(self, file_ids):
+        with self.lock:
+            found = [file_id for file_id in file_ids if file_id in self.manifest_ids]
+        return [manifest for manifest in map(self.get_manifest, found) if manifest is not None]
+
+    def digests_in_range(self, start, end, bits):
+        with self.lock:
+            digests = list(self.digests)
+        return [digest for digest in digests if in_ring_range(chunk_key(digest, bits), start, end)]
+
+    def __contains__(self, digest):
+        return os.path.exists(self._path(digest))
+
+    def __len__(self):
+        return len(self.digests)
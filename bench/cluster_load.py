@@ -0,0 +1,434 @@
+"""
+Prueba de carga de extremo a extremo: levanta un anillo de N nodos en localhost con run.py y le envía una
+mezcla de subidas, búsquedas y joins por HTTP, a una tasa fija o con una concurrencia fija.
+
+    python -m bench.cluster_load --nodes 5 --mix upload=30,lookup=65,join=5 --concurrency 8 --duration 20 --output carga.json
+    python -m bench.cluster_load --nodes 5 --rate 200 --duration 20 --node-args "--transport binary"
+
+Reporta por operación la latencia (p50, p95, p99), el rendimiento, la tasa de error y las peticiones
+entre nodos que cuesta cada operación, y guarda los resultados en JSON para comparar versiones.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from tabulate import tabulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPERATIONS = ('upload', 'lookup', 'join')
+# Endpoints que llama este script (nombres de las funciones de app/api.py); el resto de las peticiones
+# que reciben los nodos son llamadas entre nodos
+CLIENT_ENDPOINTS = {'store_file', 'store_file_batch', 'find_file', 'join_network', 'metrics'}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Operación desconocida '{name}' (válidas: {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Cluster:
+    """
+    Procesos run.py en localhost, uno por nodo, en los puertos base_port, base_port + 1, ...
+    Los nodos de reserva se levantan al inicio pero solo entran al anillo con una operación join.
+    """
+    def __init__(self, nodes, spare_nodes, base_port, bits, node_args, log_dir):
+        self.ports = [base_port + i for i in range(nodes)]
+        self.spare_ports = [base_port + nodes + i for i in range(spare_nodes)]
+        self.all_ports = self.ports + self.spare_ports
+        self.bits = bits
+        self.node_args = node_args
+        self.log_dir = log_dir
+        self.processes = []
+        self.logs = []
+        self.session = requests.Session()
+
+    def url(self, port, path):
+        return f"http://127.0.0.1:{port}{path}"
+
+    def start(self, timeout=30.0):
+        for port in self.all_ports:
+            log = open(os.path.join(self.log_dir, f"node-{port}.log"), 'w')
+            self.logs.append(log)
+            command = [sys.executable, 'run.py', str(port), '--bits', str(self.bits)] + self.node_args
+            self.processes.append(subprocess.Popen(command, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT))
+        deadline = time.monotonic() + timeout
+        for port in self.all_ports:
+            while True:
+                try:
+                    self.session.get(self.url(port, '/ping'), timeout=1).raise_for_status()
+                    break
+                except requests.exceptions.RequestException:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"El nodo {port} no respondió en {timeout} s (ver {self.log_dir})")
+                    time.sleep(0.1)
+
+    def form_ring(self, timeout=60.0):
+        for port in self.ports[1:]:
+            response = self.session.post(self.url(port, '/join'), json={'node_port': self.ports[0], 'node_ip': '127.0.0.1'})
+            if response.status_code != 200:
+                raise RuntimeError(f"El nodo {port} no se pudo unir al anillo: {response.text}")
+        deadline = time.monotonic() + timeout
+        while not self.ring_is_stable():
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"El anillo no se estabilizó en {timeout} s")
+            time.sleep(0.5)
+
+    def ring_is_stable(self):
+        """
+        True si al seguir los sucesores desde el primer nodo se recorren todos los nodos del anillo y se vuelve al inicio.
+        """
+        successors = {}
+        for port in self.ports:
+            state = self.session.get(self.url(port, '/node_state')).json()
+            successors[state['port']] = state['successor']['port']
+        port, visited = self.ports[0], []
+        for _ in range(len(self.ports)):
+            visited.append(port)
+            port = successors.get(port)
+        return port == self.ports[0] and sorted(visited) == sorted(self.ports)
+
+    def counters(self):
+        """
+        Peticiones entre nodos hasta ahora: las salientes de todos los procesos (también los de reserva, para
+        que los totales sean comparables antes y después de un join) y las recibidas por endpoint.
+        """
+        outbound = 0
+        inbound = {}
+        for port in self.all_ports:
+            metrics = self.session.get(self.url(port, '/metrics')).json()
+            outbound += metrics['outbound_rpc']['requests']
+            for endpoint, stats in metrics['endpoints'].items():
+                if endpoint not in CLIENT_ENDPOINTS:
+                    inbound[endpoint] = inbound.get(endpoint, 0) + stats['count']
+        return outbound, inbound
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        for log in self.logs:
+            log.close()
+        self.logs = []
+
+
+class Workload:
+    """
+    Operaciones de la prueba. Cada hilo usa su propia sesión HTTP (keep-alive) y cada operación retorna
+    (éxito, saltos informados por el nodo).
+    """
+    def __init__(self, cluster, seed):
+        self.cluster = cluster
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.uploaded = []
+        self.next_file = 0
+        self.skipped_joins = 0
+
+    def _session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
+    def _ring_port(self):
+        with self.lock:
+            return self.random.choice(self.cluster.ports)
+
+    def preload(self, count, batch=1000):
+        names = [f"preload-{i}" for i in range(count)]
+        for start in range(0, count, batch):
+            response = self.cluster.session.post(self.cluster.url(self.cluster.ports[0], '/upload_batch'),
+                                                 json={'file_names': names[start:start + batch]})
+            if response.status_code != 200 or not response.json()['success']:
+                raise RuntimeError(f"No se pudieron precargar las claves: {response.text}")
+        self.uploaded.extend(names)
+
+    def upload(self):
+        with self.lock:
+            file_name = f"file-{self.next_file}"
+            self.next_file += 1
+        response = self._session().post(self.cluster.url(self._ring_port(), '/upload'), json={'file_name': file_name})
+        if response.status_code != 200:
+            return False, None
+        with self.lock:
+            self.uploaded.append(file_name)
+        return True, response.json().get('hops')
+
+    def lookup(self):
+        with self.lock:
+            file_name = self.random.choice(self.uploaded) if self.uploaded else 'missing'
+        response = self._session().get(self.cluster.url(self._ring_port(), '/find_file'), params={'file_name': file_name})
+        if response.status_code != 200:
+            return False, None
+        return True, response.json().get('hops')
+
+    def join(self):
+        with self.lock:
+            if not self.cluster.spare_ports:
+                self.skipped_joins += 1
+                return None, None
+            port = self.cluster.spare_ports.pop(0)
+            known_port = self.random.choice(self.cluster.ports)
+        response = self._session().post(self.cluster.url(port, '/join'), json={'node_port': known_port, 'node_ip': '127.0.0.1'})
+        if response.status_code != 200:
+            return False, None
+        with self.lock:
+            self.cluster.ports.append(port)
+        return True, response.json().get('hops')
+
+    def run(self, name):
+        started = time.perf_counter()
+        try:
+            success, hops = getattr(self, name)()
+        except Exception:
+            # Cualquier error (conexión, respuesta que no es JSON...) cuenta como operación fallida; si se
+            # propagara, el hilo de drive_concurrency terminaría y drive_rate lo perdería en su executor
+            success, hops = False, None
+        return name, success, hops, started
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {name: [] for name in OPERATIONS}
+        self.errors = {name: 0 for name in OPERATIONS}
+        self.hops = {name: [] for name in OPERATIONS}
+
+    def record(self, name, success, hops, latency):
+        if success is None:
+            return
+        with self.lock:
+            self.samples[name].append(latency)
+            if not success:
+                self.errors[name] += 1
+            if hops is not None:
+                self.hops[name].append(hops)
+
+
+def pick(mix, generator):
+    names = list(mix)
+    return generator.choices(names, weights=[mix[name] for name in names])[0]
+
+
+def drive_concurrency(workload, recorder, mix, concurrency, duration, max_requests, seed=0):
+    """
+    Carga de lazo cerrado: concurrency hilos que envían una operación apenas termina la anterior. El hilo i
+    elige sus operaciones con la semilla seed + i.
+    """
+    deadline = time.perf_counter() + duration
+    issued = [0]
+    lock = threading.Lock()
+
+    def worker(seed):
+        generator = random.Random(seed)
+        while time.perf_counter() < deadline:
+            with lock:
+                if max_requests and issued[0] >= max_requests:
+                    return
+                issued[0] += 1
+            name, success, hops, started = workload.run(pick(mix, generator))
+            recorder.record(name, success, hops, time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker, args=(seed + index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def drive_rate(workload, recorder, mix, rate, concurrency, duration, max_requests, seed=0):
+    """
+    Carga de lazo abierto: una operación cada 1/rate segundos, atendidas por concurrency hilos. La latencia
+    se mide desde el instante en que la operación debía empezar, así que incluye el tiempo en cola cuando
+    el anillo no alcanza la tasa pedida.
+    """
+    generator = random.Random(seed)
+    total = int(rate * duration)
+    if max_requests:
+        total = min(total, max_requests)
+
+    def task(name, scheduled):
+        name, success, hops, _ = workload.run(name)
+        recorder.record(name, success, hops, time.perf_counter() - scheduled)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i in range(total):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(task, pick(mix, generator), scheduled)
+
+
+def measure_cost(cluster, workload, name, count, baseline_rate):
+    """
+    Peticiones entre nodos por operación: se ejecutan count operaciones name una tras otra y al total de
+    peticiones se le resta el mantenimiento del anillo (stabilize, fix_fingers...) estimado con baseline_rate.
+    """
+    before, _ = cluster.counters()
+    started = time.perf_counter()
+    done = 0
+    for _ in range(count):
+        _, success, _, _ = workload.run(name)
+        done += success is not None
+    elapsed = time.perf_counter() - started
+    after, _ = cluster.counters()
+    if not done:
+        return None
+    return round(max(after - before - baseline_rate * elapsed, 0) / done, 2)
+
+
+def summarize(recorder, elapsed):
+    rows = []
+    for name in OPERATIONS:
+        samples = recorder.samples[name]
+        if not samples:
+            continue
+        rows.append({
+            'operation': name,
+            'count': len(samples),
+            'errors': recorder.errors[name],
+            'error_rate': round(recorder.errors[name] / len(samples), 4),
+            'throughput_ops': round(len(samples) / elapsed, 1),
+            'mean_ms': round(statistics.mean(samples) * 1000, 2),
+            'p50_ms': round(percentile(samples, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(samples, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 2),
+            'max_ms': round(max(samples) * 1000, 2),
+            'hops_mean': round(statistics.mean(recorder.hops[name]), 2) if recorder.hops[name] else None
+        })
+    return rows
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    spare_nodes = args.spare_nodes if args.spare_nodes is not None else (4 if args.mix.get('join') else 0)
+    log_dir = args.log_dir or tempfile.mkdtemp(prefix="chord-load-")
+    os.makedirs(log_dir, exist_ok=True)
+    # Los joins de la medición de costo también usan nodos de reserva
+    calibration_joins = 1 if args.mix.get('join') and args.cost_ops else 0
+    cluster = Cluster(args.nodes, spare_nodes + calibration_joins, args.base_port, args.bits, shlex.split(args.node_args), log_dir)
+    try:
+        cluster.start()
+        cluster.form_ring()
+        workload = Workload(cluster, args.seed)
+        if args.preload:
+            workload.preload(args.preload)
+
+        # Peticiones por segundo del mantenimiento del anillo sin carga
+        before, _ = cluster.counters()
+        time.sleep(args.idle_seconds)
+        after, _ = cluster.counters()
+        baseline_rate = (after - before) / args.idle_seconds if args.idle_seconds else 0.0
+
+        costs = {}
+        if args.cost_ops:
+            for name in args.mix:
+                count = calibration_joins if name == 'join' else args.cost_ops
+                costs[name] = measure_cost(cluster, workload, name, count, baseline_rate)
+
+        recorder = Recorder()
+        outbound_before, inbound_before = cluster.counters()
+        started = time.perf_counter()
+        if args.rate:
+            drive_rate(workload, recorder, args.mix, args.rate, args.concurrency, args.duration, args.requests, args.seed)
+        else:
+            drive_concurrency(workload, recorder, args.mix, args.concurrency, args.duration, args.requests, args.seed)
+        elapsed = time.perf_counter() - started
+        outbound_after, inbound_after = cluster.counters()
+
+        rows = summarize(recorder, elapsed)
+        for row in rows:
+            row['inter_node_requests_per_op'] = costs.get(row['operation'])
+        total = sum(row['count'] for row in rows)
+        errors = sum(row['errors'] for row in rows)
+        inter_node = outbound_after - outbound_before
+        summary = {
+            'operations': total,
+            'seconds': round(elapsed, 3),
+            'throughput_ops': round(total / elapsed, 1) if elapsed else None,
+            'error_rate': round(errors / total, 4) if total else None,
+            'inter_node_requests': inter_node,
+            'maintenance_requests_per_second': round(baseline_rate, 1),
+            'inter_node_requests_per_op': round(max(inter_node - baseline_rate * elapsed, 0) / total, 2) if total else None,
+            'inter_node_by_endpoint': {endpoint: count - inbound_before.get(endpoint, 0)
+                                       for endpoint, count in sorted(inbound_after.items()) if count > inbound_before.get(endpoint, 0)},
+            'skipped_joins': workload.skipped_joins,
+            'final_nodes': len(cluster.ports)
+        }
+        return rows, summary, log_dir
+    finally:
+        cluster.stop()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prueba de carga de un anillo Chord local levantado con run.py")
+    parser.add_argument('--nodes', type=int, default=5, help="Nodos del anillo inicial")
+    parser.add_argument('--spare-nodes', type=int, default=None,
+                        help="Nodos de reserva para las operaciones join (por defecto 4 si la mezcla incluye join)")
+    parser.add_argument('--base-port', type=int, default=7100)
+    parser.add_argument('--bits', type=int, default=32, help="Bits del espacio de identificadores de los nodos")
+    parser.add_argument('--node-args', default='', help="Argumentos extra para run.py, p. ej. \"--transport binary\"")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('upload=30,lookup=70'),
+                        help="Pesos de cada operación, p. ej. upload=30,lookup=65,join=5")
+    parser.add_argument('--concurrency', type=int, default=8, help="Operaciones en curso a la vez (hilos)")
+    parser.add_argument('--rate', type=float, default=None, help="Operaciones por segundo (lazo abierto); sin esta opción, lazo cerrado")
+    parser.add_argument('--duration', type=float, default=10.0, help="Segundos de carga")
+    parser.add_argument('--requests', type=int, default=None, help="Máximo de operaciones (además del límite de tiempo)")
+    parser.add_argument('--preload', type=int, default=1000, help="Claves subidas antes de la prueba para las búsquedas")
+    parser.add_argument('--cost-ops', type=int, default=50,
+                        help="Operaciones de cada tipo, una tras otra, para medir las peticiones entre nodos por operación (0 = no medir)")
+    parser.add_argument('--idle-seconds', type=float, default=3.0, help="Segundos sin carga para medir el tráfico de mantenimiento")
+    parser.add_argument('--seed', type=int, default=0, help="Semilla para elegir operaciones, nodos y claves")
+    parser.add_argument('--log-dir', default=None, help="Directorio para los logs de los nodos (por defecto, uno temporal)")
+    parser.add_argument('--output', default=None, help="Archivo JSON donde guardar los resultados")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    rows, summary, log_dir = run(args)
+    print(tabulate(rows, headers="keys", tablefmt="pretty"))
+    print(tabulate([{key: value for key, value in summary.items() if key != 'inter_node_by_endpoint'}], headers="keys", tablefmt="pretty"))
+    print(f"Logs de los nodos en {log_dir}")
+    if args.output:
+        config = dict(vars(args), mix=args.mix)
+        with open(args.output, 'w') as output:
+            json.dump({'config': config, 'revision': git_revision(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'results': rows, 'summary': summary}, output, indent=2)
@@ -0,0 +1,108 @@
+"""
+Benchmark de enrutamiento sobre anillos simulados en memoria (app/simulator.py).
+
+    python -m bench.ring_benchmark --sizes 10 100 1000 --bits 32 --output resultados.json
+"""
+import argparse
+import json
+import logging
+import statistics
+import time
+
+from tabulate import tabulate
+
+from app.simulator import SimulatedRing
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def bench_lookups(ring, lookups):
+    sorted_ids = ring.sorted_ids()
+    hops = []
+    wrong = 0
+    started = time.perf_counter()
+    for _ in range(lookups):
+        node = ring.random.choice(ring.nodes)
+        key = ring.random.randrange(ring.ring_size)
+        owner, hop_count = node.find_successor(key)
+        hops.append(hop_count)
+        if owner is None or owner['id'] != ring.owner_of(key, sorted_ids):
+            wrong += 1
+    elapsed = time.perf_counter() - started
+    return {
+        'lookup_hops_mean': round(statistics.mean(hops), 3),
+        'lookup_hops_p99': percentile(hops, 0.99),
+        'lookup_wrong': wrong,
+        'lookups_per_second': round(lookups / elapsed, 1)
+    }
+
+
+def bench_joins(ring, joins):
+    costs = [ring.join()[1] for _ in range(joins)]
+    return {'join_messages_mean': round(statistics.mean(costs), 2), 'join_messages_max': max(costs)}
+
+
+def bench_convergence(ring, max_rounds, fix_fingers):
+    result = ring.converge(max_rounds=max_rounds, fix_fingers=fix_fingers)
+    return {
+        'converge_rounds': result['rounds'],
+        'converge_messages': result['messages'],
+        'converge_seconds': round(result['seconds'], 3)
+    }
+
+
+def bench_bulk_placement(ring, keys):
+    node = ring.random.choice(ring.nodes)
+    file_ids = [ring.random.randrange(ring.ring_size) for _ in range(keys)]
+    before = ring.transport.messages
+    started = time.perf_counter()
+    results, _ = node.store_files_batch(file_ids)
+    elapsed = time.perf_counter() - started
+    return {
+        'bulk_keys_per_second': round(keys / elapsed, 1),
+        'bulk_messages': ring.transport.messages - before,
+        'bulk_failed': sum(1 for result in results if not result['success'])
+    }
+
+
+def run(size, args):
+    ring = SimulatedRing(bits=args.bits, seed=args.seed)
+    started = time.perf_counter()
+    ring.build_static(size)
+    row = {'nodes': size, 'bits': args.bits, 'build_seconds': round(time.perf_counter() - started, 3)}
+
+    row.update(bench_lookups(ring, args.lookups))
+    row.update(bench_bulk_placement(ring, args.bulk_keys))
+    row.update(bench_joins(ring, args.joins))
+    if size <= args.converge_max_nodes:
+        row.update(bench_convergence(ring, args.max_rounds, args.fix_fingers))
+    return row
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de enrutamiento Chord en un anillo simulado")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--bits', type=int, default=32, help="Bits del espacio de identificadores (hasta 160)")
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--joins', type=int, default=20, help="Nodos que se unen al anillo ya construido")
+    parser.add_argument('--bulk-keys', type=int, default=10000)
+    parser.add_argument('--max-rounds', type=int, default=500, help="Máximo de rondas de mantenimiento para converger")
+    parser.add_argument('--fix-fingers', type=int, default=1, help="Entradas de la finger table corregidas por ronda")
+    parser.add_argument('--converge-max-nodes', type=int, default=1000, help="Solo se mide la convergencia hasta este tamaño")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Archivo JSON donde guardar los resultados")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    rows = [run(size, args) for size in args.sizes]
+    print(tabulate(rows, headers="keys", tablefmt="pretty"))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'config': vars(args), 'results': rows}, output, indent=2)
@@ -0,0 +1,99 @@
+"""
+Latencia por salto de las llamadas entre nodos: JSON sobre HTTP (NodeClient) vs. el transporte binario
+(app/binary_rpc.py). Levanta un nodo en este mismo proceso con ambos servidores.
+
+    python -m bench.rpc_latency --requests 5000 --output latencias.json
+"""
+import argparse
+import json
+import logging
+import statistics
+import threading
+import time
+
+from tabulate import tabulate
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import api
+from app.binary_rpc import BinaryTransport, encode
+from app.client import NodeClient
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def start_node(port, rpc_port_offset):
+    node = api.create_chord_node(0, port, '127.0.0.1', transport='binary', rpc_port_offset=rpc_port_offset)
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    WSGIRequestHandler.disable_nagle_algorithm = True
+    server = make_server('127.0.0.1', port, api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return node, server
+
+
+def measure(client, node, method, path, args, count, warmup):
+    send = client.get if method == 'GET' else client.post
+    for _ in range(warmup):
+        send(node, path, args)
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = send(node, path, args)
+        samples.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} respondió {response.status_code}")
+    return samples
+
+
+def run(args):
+    node, server = start_node(args.port, args.rpc_port_offset)
+    target = node.node_info()
+    operations = [
+        ('GET', '/ping', {}),
+        ('GET', '/find_successor_step', {'file_id': 2**args.bits - 1}),
+        ('POST', '/check_batch', {'file_ids': list(range(args.batch))})
+    ]
+    transports = [('http+json', NodeClient()), ('binary', BinaryTransport(port_offset=args.rpc_port_offset))]
+    rows = []
+    try:
+        for method, path, payload in operations:
+            for name, client in transports:
+                samples = measure(client, target, method, path, payload, args.requests, args.warmup)
+                rows.append({
+                    'operation': path,
+                    'transport': name,
+                    'payload_bytes': len(encode(payload)) if name == 'binary' else len(json.dumps(payload)),
+                    'mean_us': round(statistics.mean(samples) * 1e6, 1),
+                    'p50_us': round(percentile(samples, 0.5) * 1e6, 1),
+                    'p99_us': round(percentile(samples, 0.99) * 1e6, 1),
+                    'requests_per_second': round(len(samples) / sum(samples), 1)
+                })
+    finally:
+        server.shutdown()
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Latencia por salto de los transportes RPC entre nodos")
+    parser.add_argument('--port', type=int, default=7000)
+    parser.add_argument('--rpc-port-offset', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=2000, help="Peticiones medidas por operación y transporte")
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--bits', type=int, default=8)
+    parser.add_argument('--batch', type=int, default=100, help="Claves por petición de /check_batch")
+    parser.add_argument('--output', default=None, help="Archivo JSON donde guardar los resultados")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    rows = run(args)
+    print(tabulate(rows, headers="keys", tablefmt="pretty"))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'config': vars(args), 'results': rows}, output, indent=2)
@@ -1,11 +1,111 @@
-import sys
+import argparse
+import logging
+import threading
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
 from app.api import create_chord_node, app
+from app.hashing import node_key
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Inicia un nodo de la red Chord")
+    parser.add_argument('port', type=int, nargs='?', default=5000)
+    parser.add_argument('node_id', type=int, nargs='?', default=None, help="ID del nodo (por defecto, SHA-1 de ip:puerto)")
+    parser.add_argument('node_ip', nargs='?', default='127.0.0.1')  # Agregar parámetro para la IP
+    parser.add_argument('--log-level', default='WARNING', help="DEBUG, INFO, WARNING o ERROR")
+    parser.add_argument('--bits', type=int, default=32,
+                        help="Bits del espacio de identificadores (igual en todo el anillo, hasta 160). Con pocos bits dos "
+                             "direcciones pueden tener el mismo id: el join de la segunda se rechaza")
+    parser.add_argument('--vnodes', type=int, default=1,
+                        help="Nodos virtuales de este proceso, en los puertos port, port+1, ..., cada uno con id SHA-1 de ip:puerto")
+    # Parámetros del pool de conexiones hacia los demás nodos
+    parser.add_argument('--pool-size', type=int, default=10, help="Conexiones keep-alive por nodo remoto")
+    parser.add_argument('--connect-timeout', type=float, default=2.0)
+    parser.add_argument('--read-timeout', type=float, default=10.0)
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--backoff', type=float, default=0.1)
+    parser.add_argument('--fanout-workers', type=int, default=8, help="Peticiones concurrentes al enviar lotes a varios nodos")
+    parser.add_argument('--hedge-workers', type=int, default=64,
+                        help="Peticiones concurrentes de las lecturas escalonadas (responsable y réplicas)")
+    parser.add_argument('--data-dir', default=None, help="Directorio para persistir las claves del nodo")
+    parser.add_argument('--cache-size', type=int, default=1024, help="Entradas de la caché de nodos responsables")
+    parser.add_argument('--replicas', type=int, default=2, help="Sucesores que guardan una copia de cada clave")
+    parser.add_argument('--cache-ttl', type=float, default=30.0, help="Segundos de vida de una entrada de la caché")
+    parser.add_argument('--chunk-size', type=int, default=1024 * 1024, help="Bytes por bloque del contenido de los archivos")
+    parser.add_argument('--parallel-chunks', type=int, default=4,
+                        help="Bloques que se suben o descargan a la vez en /upload_file y /download_file")
+    parser.add_argument('--handoff-batch', type=int, default=10000,
+                        help="Claves por lote al transferir un rango de claves a otro nodo (join y leave)")
+    parser.add_argument('--transport', choices=['http', 'binary'], default='http',
+                        help="Protocolo de las llamadas entre nodos (todos los nodos del anillo deben usar el mismo)")
+    parser.add_argument('--rpc-port-offset', type=int, default=1000,
+                        help="Con --transport binary, el servidor binario escucha en el puerto del nodo + este valor")
+    parser.add_argument('--server', choices=['waitress', 'werkzeug'], default='waitress',
+                        help="Servidor WSGI: waitress (producción) o el servidor de desarrollo de Flask")
+    parser.add_argument('--threads', type=int, default=16, help="Hilos que atienden peticiones con --server waitress")
+    # Intervalos (en segundos) de las tareas periódicas de mantenimiento del anillo; 0 las desactiva
+    parser.add_argument('--stabilize-interval', type=float, default=1.0)
+    parser.add_argument('--fix-fingers-interval', type=float, default=0.5)
+    parser.add_argument('--check-predecessor-interval', type=float, default=2.0)
+    parser.add_argument('--repair-interval', type=float, default=30.0,
+                        help="Cada cuánto se comparan las claves de cada nodo con las de sus réplicas")
+    args = parser.parse_args()
+    if not 1 <= args.bits <= 160:
+        parser.error("--bits debe estar entre 1 y 160")
+    return args
+
 
 if __name__ == '__main__':
-    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
-    node_id = int(sys.argv[2]) if len(sys.argv) > 2 else port
-    node_ip = sys.argv[3] if len(sys.argv) > 3 else '127.0.0.1'  # Agregar parámetro para la IP
+    args = parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # El log de acceso de werkzeug (una línea por petición) solo se muestra con --log-level INFO o DEBUG
+    logging.getLogger('waitress').setLevel(args.log_level.upper())
+    logging.getLogger('werkzeug').setLevel(args.log_level.upper())
+    ports = [args.port + i for i in range(args.vnodes)]
+    # Un node_id explícito solo aplica al primer nodo; los demás (nodos virtuales) siempre usan el hash
+    node_ids = [node_key(args.node_ip, port, args.bits) for port in ports]
+    if args.node_id is not None:
+        node_ids[0] = args.node_id
+    if len(set(node_ids)) < len(node_ids):
+        raise SystemExit(f"Dos nodos virtuales de este proceso tienen el mismo id con --bits {args.bits}: {node_ids}")
 
-    chord_node = create_chord_node(node_id, port, node_ip)  # Pasar la IP al crear el nodo
+    client_options = {
+        'pool_size': args.pool_size,
+        'connect_timeout': args.connect_timeout,
+        'read_timeout': args.read_timeout,
+        'retries': args.retries,
+        'backoff': args.backoff,
+        'fanout_workers': args.fanout_workers,
+        'hedge_workers': args.hedge_workers
+    }
+    client = None
+    for node_id, port in zip(node_ids, ports):
+        chord_node = create_chord_node(node_id, port, args.node_ip, client_options,  # Pasar la IP al crear el nodo
+                                       data_dir=args.data_dir,
+                                       cache_options={'cache_size': args.cache_size, 'cache_ttl': args.cache_ttl},
+                                       transport=args.transport, rpc_port_offset=args.rpc_port_offset,
+                                       bits=args.bits, process=f"{args.node_ip}:{args.port}", client=client,
+                                       replicas=args.replicas,
+                                       content_options={'chunk_size': args.chunk_size, 'parallel_chunks': args.parallel_chunks},
+                                       handoff_batch=args.handoff_batch)
+        # Los nodos virtuales del proceso comparten el pool de conexiones
+        client = chord_node.client
+        chord_node.start_maintenance(args.stabilize_interval, args.fix_fingers_interval, args.check_predecessor_interval,
+                                     args.repair_interval)
 
-    app.run(host='0.0.0.0', port=port)
+    if args.server == 'waitress':
+        # waitress mantiene las conexiones keep-alive y activa TCP_NODELAY por defecto; un /join o /upload que
+        # espera a otros nodos ocupa un hilo, así que --threads debe cubrir esas peticiones anidadas
+        from waitress import serve
+        serve(app, listen=' '.join(f"0.0.0.0:{port}" for port in ports), threads=args.threads,
+              connection_limit=max(100, 4 * args.threads * len(ports)))
+    else:
+        # HTTP/1.1 para que las conexiones keep-alive de los demás nodos se puedan reutilizar
+        WSGIRequestHandler.protocol_version = "HTTP/1.1"
+        # Sin TCP_NODELAY cada respuesta keep-alive espera el ACK retardado del cliente (~40 ms por llamada)
+        WSGIRequestHandler.disable_nagle_algorithm = True
+        for port in ports[1:]:
+            server = make_server('0.0.0.0', port, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        app.run(host='0.0.0.0', port=args.port, threaded=True)
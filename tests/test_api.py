@@ -0,0 +1,49 @@
+import pytest
+
+from app import api
+from app.simulator import SimulatedRing
+
+
+@pytest.fixture
+def client(monkeypatch):
+    ring = SimulatedRing(bits=8)
+    for node_id in (10, 120, 200):
+        ring.create_node(node_id)
+    ring.build_static(0)
+    monkeypatch.setattr(api, 'chord_node', ring.nodes[0])
+    monkeypatch.setattr(api, 'nodes', {})
+    return api.app.test_client()
+
+
+@pytest.mark.parametrize('path', ['/upload_batch', '/find_batch'])
+def test_batch_rejects_malformed_bodies(client, path):
+    assert client.post(path, data='no es json', content_type='text/plain').status_code == 400
+    assert client.post(path, json=[1, 2]).status_code == 400
+    assert client.post(path, json={'file_ids': 5}).status_code == 400
+    assert client.post(path, json={}).status_code == 400
+    response = client.post(path, json={'file_ids': [1, 'abc']})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    assert client.post(path, json={'file_names': [{'a': 1}]}).status_code == 400
+
+
+def test_batch_accepts_ids_and_names(client):
+    response = client.post('/upload_batch', json={'file_ids': [5, 300], 'file_names': ['a.txt']})
+    assert response.status_code == 200
+    response = client.post('/find_batch', json={'file_ids': [5, 300], 'file_names': ['a.txt']})
+    assert response.status_code == 200
+    assert all(result['exists'] for result in response.get_json()['results'])
+
+
+def test_lookup_and_find_file_reject_invalid_keys(client):
+    assert client.get('/lookup?key=abc').status_code == 400
+    assert client.get('/find_file?file_id=abc').status_code == 400
+    assert client.get('/lookup?key=42').get_json()['node']['id'] == 120
+    assert client.get('/find_file?file_id=42').status_code == 404
+
+
+def test_join_rejects_malformed_bodies(client):
+    assert client.post('/join', data='no es json', content_type='text/plain').status_code == 400
+    assert client.post('/join', json=['127.0.0.1', 5000]).status_code == 400
+    assert client.post('/join', json={'node_port': 'abc', 'node_ip': '127.0.0.1'}).status_code == 400
+    assert client.post('/join', json={'node_address': 'x', 'node_port': 5000, 'node_ip': '127.0.0.1'}).status_code == 400
@@ -0,0 +1,140 @@
+import socket
+import threading
+
+import pytest
+import requests
+
+from app.binary_rpc import LENGTH, BinaryRpcServer, BinaryTransport, decode, decode_frame, encode, frame
+from app.simulator import SimulatedRing
+
+
+VALUES = [
+    None,
+    True,
+    False,
+    0,
+    1,
+    -1,
+    127,
+    128,
+    -129,
+    255,
+    2**64,
+    2**160 - 1,
+    -(2**159),
+    0.0,
+    -2.5,
+    1e300,
+    "",
+    "archivo.txt",
+    "ñandú 🐦",
+    b"",
+    b"\x00\xff" * 1000,
+    [],
+    [1, "dos", None, [3.0, b"\x04"]],
+    {},
+    {"file_ids": list(range(1000)), "replicate": False, "node": {"id": 2**32 - 1, "port": 5000, "ip": "127.0.0.1"}},
+    {1: "clave numérica", "anidado": {"vacío": {}}},
+]
+
+
+@pytest.mark.parametrize('value', VALUES)
+def test_round_trip(value):
+    data = encode(value)
+    decoded, offset = decode(data)
+    assert decoded == value
+    assert type(decoded) is type(value)
+    assert offset == len(data)
+
+
+def test_tuples_decode_as_lists():
+    assert decode(encode((1, (2, 3))))[0] == [1, [2, 3]]
+
+
+def test_values_decode_one_after_another():
+    data = encode("a") + encode(2) + encode([None])
+    first, offset = decode(data)
+    second, offset = decode(data, offset)
+    third, offset = decode(data, offset)
+    assert (first, second, third) == ("a", 2, [None])
+    assert offset == len(data)
+
+
+def test_frame_has_length_prefix():
+    message = ["/find_successor_step", {"file_id": 42, "exclude": "1,2"}]
+    data = frame(message)
+    (size,) = LENGTH.unpack_from(data)
+    assert size == len(data) - LENGTH.size
+    assert decode(data[LENGTH.size:])[0] == message
+
+
+def test_unsupported_type():
+    with pytest.raises(TypeError):
+        encode({1, 2})
+
+
+def test_unknown_tag():
+    with pytest.raises(ValueError):
+        decode(b'X')
+
+
+@pytest.mark.parametrize('value', [2**64, 1.5, "archivo.txt", b"\x00" * 10, [1, "dos"], {"a": 1}])
+def test_truncated_values(value):
+    data = bytes(encode(value))
+    for size in range(len(data)):
+        with pytest.raises(ValueError):
+            decode(data[:size])
+
+
+@pytest.mark.parametrize('data', [b'', b'\xff\x00', b'L\xff\xff\xff\xff', b'S\x00\x00\x00\x02\xff\xfe', bytes(encode(1)) + b'N'])
+def test_garbage_frames(data):
+    with pytest.raises(ValueError):
+        decode_frame(data)
+
+
+def read_frame(sock):
+    header = sock.recv(LENGTH.size, socket.MSG_WAITALL)
+    (size,) = LENGTH.unpack(header)
+    return decode_frame(sock.recv(size, socket.MSG_WAITALL))
+
+
+@pytest.fixture
+def server():
+    node = SimulatedRing(bits=8).create_node(5)
+    server = BinaryRpcServer(node, '127.0.0.1', 0)
+    server.start()
+    yield server.server.sockets[0].getsockname()[1]
+    server.stop()
+
+
+def test_server_answers_400_to_garbage_and_keeps_the_connection(server):
+    with socket.create_connection(('127.0.0.1', server), timeout=5) as sock:
+        payload = b'S\x00\x00\x00\x09abc'
+        sock.sendall(LENGTH.pack(len(payload)) + payload)
+        status, body = read_frame(sock)
+        assert status == 400 and 'error' in body
+        sock.sendall(frame(['/ping', {}]))
+        assert read_frame(sock)[0] == 200
+
+
+def test_client_discards_socket_after_malformed_response():
+    listener = socket.create_server(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+
+    def serve():
+        connection, _ = listener.accept()
+        with connection:
+            read_frame(connection)
+            payload = b'L\x00\x00\x00\x02'
+            connection.sendall(LENGTH.pack(len(payload)) + payload)
+            connection.recv(1)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    transport = BinaryTransport(port_offset=0)
+    with pytest.raises(requests.exceptions.RequestException):
+        transport.get({'id': 1, 'port': port, 'ip': '127.0.0.1'}, '/ping')
+    assert transport._pool(f"127.0.0.1:{port}").qsize() == 0
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    listener.close()
@@ -0,0 +1,74 @@
+from app import cache
+from app.cache import OwnerCache
+from app.simulator import SimulatedRing
+
+
+def node(node_id):
+    return {'id': node_id, 'ip': 'sim', 'port': node_id}
+
+
+def test_least_recently_used_entry_is_evicted():
+    owner_cache = OwnerCache(bits=8, capacity=2)
+    owner_cache.put(5, node(10))
+    owner_cache.put(15, node(20))
+    assert owner_cache.get(7) == node(10)
+    owner_cache.put(25, node(30))
+    # 20 es la entrada menos usada: 10 se consultó después de guardarla
+    assert owner_cache.get(15) is None
+    assert owner_cache.get(7) == node(10) and owner_cache.get(25) == node(30)
+    assert owner_cache.stats()['evictions'] == 1 and owner_cache.stats()['size'] == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    owner_cache = OwnerCache(bits=8, ttl=5.0)
+    owner_cache.put(5, node(10))
+    now[0] += 4.0
+    assert owner_cache.get(5) == node(10)
+    now[0] += 2.0
+    assert owner_cache.get(5) is None
+    assert owner_cache.stats()['size'] == 0
+    # Guardar de nuevo renueva el plazo
+    owner_cache.put(5, node(10))
+    now[0] += 4.0
+    assert owner_cache.get(5) == node(10)
+
+
+def test_range_wraps_around_zero():
+    owner_cache = OwnerCache(bits=8)
+    owner_cache.put(250, node(3))
+    for key in (250, 255, 0, 3, 256 + 2):
+        assert owner_cache.get(key) == node(3)
+    for key in (4, 100, 249):
+        assert owner_cache.get(key) is None
+    owner_cache.put(200, node(220))
+    assert owner_cache.get(210) == node(220) and owner_cache.get(1) == node(3)
+    assert owner_cache.get(230) is None
+
+
+def test_invalidate_removes_one_or_all_entries():
+    owner_cache = OwnerCache(bits=8)
+    owner_cache.put(5, node(10))
+    owner_cache.put(15, node(20))
+    owner_cache.invalidate(10, stale=True)
+    assert owner_cache.get(5) is None and owner_cache.get(15) == node(20)
+    owner_cache.invalidate()
+    assert owner_cache.get(15) is None
+    assert owner_cache.stats()['stale'] == 1 and owner_cache.stats()['invalidations'] == 2
+
+
+def test_stale_hit_is_invalidated_and_rerouted():
+    ring = SimulatedRing(bits=8, replicas=1)
+    for node_id in (10, 120, 200):
+        ring.create_node(node_id)
+    ring.build_static(0)
+    first, owner, _ = ring.nodes
+    first.store_file_via_finger_table(100)
+    # Entrada desactualizada: 10 no tiene la clave 100 ni como réplica y contesta que no le corresponde
+    first.owner_cache.invalidate()
+    first.owner_cache.put(100, first.node_info())
+    node_id, _, _ = first.find_and_store_local_file(100)
+    assert node_id == owner.id
+    assert first.owner_cache.stats()['stale'] == 1
+    assert first.owner_cache.get(100)['id'] == owner.id
@@ -0,0 +1,35 @@
+import threading
+import time
+
+from app.client import NodeClient
+
+
+def test_hedge_does_not_wait_for_busy_fan_out_pool():
+    client = NodeClient(fanout_workers=2)
+    release = threading.Event()
+    busy = [client.executor.submit(release.wait) for _ in range(4)]
+    # Si el envío quedara en cola detrás de las tareas ocupadas, se liberan igual para que la prueba falle sin colgarse
+    threading.Timer(2.0, release.set).start()
+    try:
+        started = time.perf_counter()
+        node, response, _ = client.hedge([{'id': 1}, {'id': 2}], lambda node: node['id'], lambda response: response == 1, 0.05)
+        assert (node, response) == ({'id': 1}, 1)
+        assert time.perf_counter() - started < 1.0
+    finally:
+        release.set()
+        for future in busy:
+            future.result()
+
+
+def test_hedge_falls_back_to_next_node():
+    client = NodeClient()
+
+    def send(node):
+        if node['id'] == 1:
+            time.sleep(0.5)
+        return node['id']
+
+    started = time.perf_counter()
+    node, response, answers = client.hedge([{'id': 1}, {'id': 2}], send, lambda response: True, 0.02)
+    assert response == 2
+    assert time.perf_counter() - started < 0.4
@@ -0,0 +1,88 @@
+import io
+import os
+
+from app import rpc
+from app.simulator import SimulatedRing
+from app.storage import chunk_key
+
+
+def small_ring(*ids):
+    ring = SimulatedRing(bits=8)
+    for node_id in ids:
+        ring.create_node(node_id)
+    ring.build_static(0)
+    return ring
+
+
+def join(ring, node_id, via):
+    node = ring.create_node(node_id)
+    node.join((via.id, via.port, via.ip))
+    for _ in range(5):
+        ring.maintenance_round()
+    return node
+
+
+def test_ids_beyond_ring_size_are_handed_off():
+    ring = small_ring(10, 200)
+    first = ring.nodes[0]
+    body, _ = rpc.dispatch(first, '/upload', {'file_id': 300})
+    assert body['file_id'] == 44
+    rpc.dispatch(first, '/upload', {'file_id': 44})
+    node = join(ring, 100, first)
+    assert list(node.files) == [44]
+    assert all(44 not in other.files for other in ring.nodes if other is not node)
+
+
+def test_join_hands_off_manifests_and_chunks():
+    ring = small_ring(10, 120, 200)
+    for node in ring.nodes:
+        node.chunk_size = 64
+    first = ring.nodes[0]
+    manifests = [first.upload_content(f"archivo-{index}.bin", io.BytesIO(os.urandom(1000))) for index in range(20)]
+    node = join(ring, 60, first)
+    # Con 8 bits dos nombres pueden tener la misma clave: vale el último manifiesto guardado
+    moved = [manifest for manifest in {manifest['file_id']: manifest for manifest in manifests}.values()
+             if 10 < manifest['file_id'] <= 60]
+    assert moved
+    for manifest in moved:
+        assert manifest['file_id'] in node.files
+        assert node.chunks.get_manifest(manifest['file_id']) == manifest
+    digests = {digest for manifest in manifests for digest in manifest['chunks']}
+    assert all(digest in node.chunks for digest in digests if 10 < chunk_key(digest, 8) <= 60)
+
+
+def test_leave_keeps_keys_manifests_and_chunks_readable():
+    ring = small_ring(10, 60, 120, 200)
+    for node in ring.nodes:
+        node.chunk_size = 64
+    first, leaving = ring.nodes[0], ring.nodes[1]
+    for file_id in range(0, 256, 7):
+        rpc.dispatch(first, '/upload', {'file_id': file_id})
+    contents = {f"archivo-{index}.bin": os.urandom(1000) for index in range(20)}
+    for file_name, data in contents.items():
+        assert first.upload_content(file_name, io.BytesIO(data)) is not None
+    moved = set(leaving.files)
+    manifests = leaving.chunks.manifests_for(list(moved))
+    digests = leaving.chunks.digests_in_range(10, 60, 8)
+    assert moved and manifests and digests
+
+    result, _ = ring.leave(leaving)
+    assert result['success']
+    successor = ring.nodes[1]
+    assert moved <= set(successor.files)
+    assert all(successor.chunks.get_manifest(manifest['file_id']) == manifest for manifest in manifests)
+    assert all(digest in successor.chunks for digest in digests)
+    # Los vecinos quedan enlazados al salir y el mantenimiento repara las finger tables
+    assert ring.nodes[0].successor.id == 120 and ring.nodes[1].predecessor.id == 10
+    assert ring.converge()['rounds'] is not None
+    assert all(leaving.id not in node.finger_table.successor_ids for node in ring.nodes)
+
+    for node in ring.nodes:
+        for file_id in range(0, 256, 7):
+            assert node.find_and_store_local_file(file_id)[0] is not None
+        # Con 8 bits dos nombres pueden tener la misma clave: se comprueban los que conservan su manifiesto
+        for file_name, data in contents.items():
+            manifest = node.get_manifest(file_name)
+            assert manifest is not None
+            if manifest['file_name'] == file_name:
+                assert b''.join(node.read_content(manifest)) == data
@@ -0,0 +1,29 @@
+from app.hashing import hash_key, node_key
+
+
+def test_ids_are_sha1_modulo_ring_size():
+    # Vectores conocidos de SHA-1: "abc" y la cadena vacía
+    assert hash_key('abc', 160) == 0xa9993e364706816aba3e25717850c26c9cd0d89d
+    assert hash_key('abc', 32) == 0x9cd0d89d
+    assert hash_key('abc', 8) == 0x9d
+    assert hash_key(b'', 16) == 0x0709
+    assert hash_key(123, 32) == hash_key('123', 32) == hash_key(b'123', 32)
+    assert node_key('127.0.0.1', 5000, 32) == hash_key('127.0.0.1:5000', 32)
+
+
+def test_virtual_nodes_have_distinct_ids_and_balance_the_ring():
+    bits = 32
+    ring_size = 2**bits
+    processes = 8
+    for vnodes, bound in ((1, 3.0), (64, 1.3)):
+        # Como run.py con --vnodes: un id por puerto port, port+1, ... de cada proceso
+        owners = {}
+        for process in range(processes):
+            for port in range(5000 + 100 * process, 5000 + 100 * process + vnodes):
+                owners[node_key('10.0.0.1', port, bits)] = process
+        assert len(owners) == processes * vnodes
+        ids = sorted(owners)
+        shares = [0] * processes
+        for position, node_id in enumerate(ids):
+            shares[owners[node_id]] += (node_id - ids[position - 1]) % ring_size
+        assert max(shares) / ring_size * processes < bound
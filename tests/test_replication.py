@@ -0,0 +1,52 @@
+from app.simulator import SimulatedRing
+from app.storage import keys_digest, ring_buckets
+
+
+def test_ring_buckets_cover_the_interval():
+    assert ring_buckets(10, 20, 4, 256) == [(10, 12), (12, 15), (15, 17), (17, 20)]
+    assert ring_buckets(250, 2, 64, 256) == [(250, 251), (251, 252), (252, 253), (253, 254), (254, 255), (255, 0), (0, 1), (1, 2)]
+    assert ring_buckets(7, 7, 2, 256) == [(7, 135), (135, 7)]
+
+
+def test_keys_digest_depends_on_keys():
+    assert keys_digest([]) == keys_digest([])
+    assert keys_digest([1, 2]) != keys_digest([1, 3])
+    assert keys_digest([1, 2])[0] == 2
+
+
+def _node(ring, info):
+    return ring.network[(info['ip'], info['port'])]
+
+
+def test_repair_restores_missed_replicate():
+    ring = SimulatedRing(bits=32, seed=1)
+    ring.build_static(6)
+    owner = ring.nodes[0]
+    replica = _node(ring, owner.replica_nodes()[0])
+    key = (owner.predecessor.id + 1) % ring.ring_size
+    # La réplica no está en la red mientras se guarda la clave
+    del ring.network[(replica.ip, replica.port)]
+    owner.store_file(owner.node_info(), key)
+    ring.network[(replica.ip, replica.port)] = replica
+    assert key not in replica.replica_files
+    for _ in range(50):
+        ring.maintenance_round()
+    assert key in replica.replica_files
+
+
+def test_replica_counts_only_after_full_copy():
+    ring = SimulatedRing(bits=32, seed=4, handoff_batch=7)
+    ring.build_static(6)
+    owner = ring.nodes[0]
+    keys = [(owner.predecessor.id + 1 + i) % ring.ring_size for i in range(50)]
+    owner.files.add_many(keys)
+    target = owner.replica_nodes()[1]
+    replica = _node(ring, target)
+    owner.replica_targets = set()
+    del ring.network[(replica.ip, replica.port)]
+    owner.stabilize()
+    assert target['id'] not in owner.replica_targets
+    ring.network[(replica.ip, replica.port)] = replica
+    owner.stabilize()
+    assert target['id'] in owner.replica_targets
+    assert all(key in replica.replica_files for key in keys)
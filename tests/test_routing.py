@@ -0,0 +1,68 @@
+import random
+
+from app.chord import in_interval
+from app.routing import FingerTable, NodeRef
+from app.simulator import SimulatedRing
+
+
+def ref(node_id):
+    return NodeRef(node_id, node_id, 'sim')
+
+
+def linear_closest_preceding(table, key, exclude=()):
+    # Recorrido lineal previo a la búsqueda con bisect: de la entrada más lejana a la más cercana
+    for peer in reversed(table.successors()):
+        if peer is not None and peer.id not in exclude and in_interval(peer.id, table.node_id, key % table.ring_size):
+            return peer
+    return None
+
+
+def test_in_interval_wraps_around_zero():
+    assert in_interval(250, 200, 10) and in_interval(5, 200, 10) and in_interval(0, 200, 10)
+    assert not in_interval(100, 200, 10) and not in_interval(200, 200, 10) and not in_interval(10, 200, 10)
+    assert in_interval(10, 200, 10, inclusive_end=True)
+    # start == end: todo el anillo menos start, que solo entra si el intervalo es cerrado
+    assert in_interval(7, 50, 50) and not in_interval(50, 50, 50) and in_interval(50, 50, 50, inclusive_end=True)
+
+
+def test_closest_preceding_with_wrapping_keys():
+    table = FingerTable(200, 8, successors=[ref(201), ref(210), ref(210), ref(210), ref(220), ref(240), ref(10), ref(80)])
+    assert table.closest_preceding(5).id == 240
+    assert table.closest_preceding(11).id == 10
+    assert table.closest_preceding(10).id == 240
+    assert table.closest_preceding(150).id == 80
+    assert table.closest_preceding(201) is None
+    assert table.closest_preceding(205).id == 201
+    # key == nodo dueño: el intervalo cubre todo el anillo
+    assert table.closest_preceding(200).id == 80
+    assert table.closest_preceding(5, exclude={240, 220}).id == 210
+
+
+def test_duplicate_fingers_are_stored_once():
+    table = FingerTable(0, 8, successors=[ref(100)] * 7 + [ref(150)])
+    assert table.peers == (ref(100), ref(150))
+    assert table.successors() == [ref(100)] * 7 + [ref(150)]
+    assert table.closest_preceding(120).id == 100
+    assert table.closest_preceding(0).id == 150
+    assert table.closest_preceding(120, exclude={100}) is None
+
+
+def test_single_node_ring_has_no_preceding_node():
+    table = FingerTable(42, 8, successors=[ref(42)] * 8)
+    for key in (0, 41, 42, 43, 255):
+        assert table.closest_preceding(key) is None
+    assert FingerTable(42, 8).closest_preceding(7) is None
+
+
+def test_bisect_matches_linear_scan_on_random_ring():
+    ring = SimulatedRing(bits=16, seed=7)
+    ring.build_static(60)
+    rng = random.Random(3)
+    for node in ring.nodes:
+        table = node.finger_table
+        peer_ids = [peer.id for peer in table.peers]
+        for _ in range(50):
+            key = rng.randrange(ring.ring_size)
+            exclude = set(rng.sample(peer_ids, min(2, len(peer_ids))))
+            assert table.closest_preceding(key) == linear_closest_preceding(table, key)
+            assert table.closest_preceding(key, exclude) == linear_closest_preceding(table, key, exclude)
@@ -0,0 +1,33 @@
+from app import rpc
+from app.simulator import SimulatedRing
+
+
+def small_ring(*ids):
+    ring = SimulatedRing(bits=8)
+    for node_id in ids:
+        ring.create_node(node_id)
+    ring.build_static(0)
+    return ring
+
+
+def test_upload_fails_when_owner_does_not_store():
+    ring = small_ring(10, 120, 200)
+    first, owner, _ = ring.nodes
+    del ring.network[(owner.ip, owner.port)]
+    body, status = rpc.dispatch(first, '/upload', {'file_id': 100})
+    assert status == 502
+    assert 'error' in body
+    ring.network[(owner.ip, owner.port)] = owner
+    body, status = rpc.dispatch(first, '/upload', {'file_id': 100})
+    assert status == 200 and 100 in owner.files
+
+
+def test_batch_results_carry_the_error_of_failed_groups():
+    ring = small_ring(10, 120, 200)
+    first, owner, _ = ring.nodes
+    del ring.network[(owner.ip, owner.port)]
+    results, _ = first.store_files_batch([5, 100, 150])
+    failed = [result for result in results if not result['success']]
+    # 150 también puede fallar si su búsqueda pasa por el nodo caído
+    assert 100 in [result['file_id'] for result in failed] and 5 not in [result['file_id'] for result in failed]
+    assert all(result['error'] for result in failed)
@@ -0,0 +1,150 @@
+import os
+import random
+import shutil
+import threading
+import time
+
+import pytest
+
+from app import storage
+from app.storage import KEY_BYTES, DiskChunkStore, LogKeyStore, MemoryChunkStore, MemoryKeyStore, chunk_digest, chunk_key
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    return str(tmp_path / "keys")
+
+
+def ring_members(keys, start, end):
+    if start < end:
+        return sorted(key for key in keys if start < key <= end)
+    return sorted(key for key in keys if key > start) + sorted(key for key in keys if key <= end)
+
+
+@pytest.mark.parametrize('kind', ['memory', 'log'])
+def test_random_operations_match_a_set(kind, store_dir):
+    generator = random.Random(5)
+    # Umbral bajo para que la prueba pase varias veces por compact()
+    store = MemoryKeyStore() if kind == 'memory' else LogKeyStore(store_dir, compact_threshold=50)
+    expected = set()
+    for _ in range(2000):
+        keys = [generator.randrange(500) for _ in range(generator.randint(1, 20))]
+        if generator.random() < 0.6:
+            assert store.add_many(keys) == len(set(keys) - expected)
+            expected.update(keys)
+        else:
+            assert store.remove_many(keys) == len(set(keys) & expected)
+            expected.difference_update(keys)
+        probe = generator.randrange(500)
+        assert (probe in store) == (probe in expected)
+        assert len(store) == len(expected)
+    assert list(store) == sorted(expected)
+    for _ in range(50):
+        start, end = generator.randrange(500), generator.randrange(500)
+        assert store.range(start, end) == ring_members(expected, start, end)
+
+
+def test_keys_survive_a_restart(store_dir):
+    store = LogKeyStore(store_dir, compact_threshold=100)
+    store.add_many(range(0, 300, 2))
+    store.remove_many(range(0, 300, 6))
+    store.add(1001)
+    expected = sorted(set(range(0, 300, 2)) - set(range(0, 300, 6)) | {1001})
+    store.close()
+
+    reopened = LogKeyStore(store_dir, compact_threshold=100)
+    assert list(reopened) == expected
+    assert len(reopened) == len(expected)
+    assert 6 not in reopened and 1001 in reopened
+
+
+def test_incomplete_record_is_discarded(store_dir):
+    store = LogKeyStore(store_dir)
+    store.add_many([1, 2])
+    store.close()
+    with open(os.path.join(store_dir, 'keys.log'), 'ab') as log_file:
+        log_file.write(b'+' + b'\x00' * (KEY_BYTES // 2))
+
+    reopened = LogKeyStore(store_dir)
+    assert list(reopened) == [1, 2]
+    reopened.add(3)
+    reopened.close()
+    assert list(LogKeyStore(store_dir)) == [1, 2, 3]
+
+
+def test_log_replayed_over_a_compacted_index(store_dir):
+    # Caída dentro de compact(): el índice nuevo ya reemplazó al anterior pero el log todavía no se vació
+    store = LogKeyStore(store_dir)
+    store.add_many([1, 2, 3])
+    store.remove(2)
+    log_path = os.path.join(store_dir, 'keys.log')
+    shutil.copy(log_path, log_path + '.before')
+    store.compact()
+    store.close()
+    shutil.copy(log_path + '.before', log_path)
+
+    reopened = LogKeyStore(store_dir)
+    assert len(reopened) == 2
+    assert list(reopened) == [1, 3]
+    assert reopened.remove(2) is False
+    assert reopened.add(1) is False
+    assert reopened.remove(3) is True
+    reopened.close()
+    assert list(LogKeyStore(store_dir)) == [1]
+
+
+def test_reads_and_writes_during_compaction(store_dir, monkeypatch):
+    store = LogKeyStore(store_dir, compact_threshold=10**9)
+    store.add_many(range(0, 20000, 2))
+    store.compact()
+    store.remove_many(range(0, 2000, 4))
+    store.add_many(range(1, 2000, 4))
+    expected = set(range(0, 20000, 2)) - set(range(0, 2000, 4)) | set(range(1, 2000, 4))
+
+    # Escritura del índice y reemplazo de archivos lentos para que las lecturas caigan dentro de la compactación
+    for name in ('fsync', 'replace'):
+        original = getattr(storage.os, name)
+        monkeypatch.setattr(storage.os, name, lambda *args, original=original: (time.sleep(0.2), original(*args))[1])
+    compaction = threading.Thread(target=store.compact)
+    compaction.start()
+    wrong = []
+    checks = 0
+    written = []
+    while compaction.is_alive():
+        for key in (4, 6, 5, 7, 19998, 20000):
+            if (key in store) != (key in expected):
+                wrong.append(key)
+        checks += 1
+        if len(written) < 50:
+            key = 30001 + 2 * len(written)
+            store.add(key)
+            written.append(key)
+    compaction.join()
+    monkeypatch.undo()
+
+    assert not wrong
+    assert checks > 10
+    expected.update(written)
+    assert len(store) == len(expected)
+    assert all(key in store for key in written)
+    store.close()
+    assert list(LogKeyStore(store_dir)) == sorted(expected)
+
+
+@pytest.mark.parametrize('kind', ['memory', 'disk'])
+def test_chunk_store_lists_manifests_and_digests(kind, tmp_path):
+    def open_store():
+        return MemoryChunkStore() if kind == 'memory' else DiskChunkStore(str(tmp_path / "chunks"))
+
+    store = open_store()
+    blocks = [os.urandom(32) for _ in range(50)]
+    for data in blocks:
+        store.put(chunk_digest(data), data)
+    store.put_manifest(7, {'file_id': 7, 'chunks': []})
+    if kind == 'disk':
+        store = open_store()
+    assert store.manifests_for([3, 7]) == [{'file_id': 7, 'chunks': []}]
+    digests = [chunk_digest(data) for data in blocks]
+    assert sorted(store.digests_in_range(200, 40, 8)) == sorted(digest for digest in digests
+                                                                 if not 40 < chunk_key(digest, 8) <= 200)
+    assert len(store) == len(set(digests))